@@ -0,0 +1,49 @@
+SUPPORTED_LANGUAGES = {
+    'auto': 'Auto-detect',
+    'en': 'English',
+    'hi': 'Hindi', 'te': 'Telugu', 'ta': 'Tamil', 'kn': 'Kannada',
+    'ml': 'Malayalam', 'mr': 'Marathi', 'bn': 'Bengali', 'gu': 'Gujarati',
+    'pa': 'Punjabi', 'or': 'Odia', 'as': 'Assamese', 'ur': 'Urdu',
+    'ne': 'Nepali', 'si': 'Sinhala', 'es': 'Spanish', 'fr': 'French',
+    'de': 'German', 'it': 'Italian', 'pt': 'Portuguese', 'ru': 'Russian',
+    'ja': 'Japanese', 'ko': 'Korean', 'zh': 'Chinese', 'ar': 'Arabic'
+}
+
+INDIC_LANGUAGE_CODES = ['hi', 'te', 'ta', 'kn', 'ml', 'mr', 'bn', 'gu', 'pa', 'or', 'as', 'ur']
+
+
+def languages_payload():
+    return {
+        'success': True,
+        'languages': SUPPORTED_LANGUAGES,
+        'indic_languages': {k: v for k, v in SUPPORTED_LANGUAGES.items() if k in INDIC_LANGUAGE_CODES}
+    }
+
+
+MOCK_ARTICLES = {
+    'technology': "Artificial Intelligence is revolutionizing the way we work and live...",
+    'health': "Regular exercise and a balanced diet are fundamental to maintaining good health...",
+    'climate': "Climate change represents one of the most pressing challenges of our time...",
+    'education': "Education is the foundation of personal and societal development..."
+}
+
+
+def search_article_mock(keyword):
+    keyword_lower = keyword.lower()
+    for key, article in MOCK_ARTICLES.items():
+        if key in keyword_lower or keyword_lower in key:
+            return {
+                'success': True,
+                'keyword': keyword,
+                'title': f"Article about {key.title()}",
+                'content': article,
+                'source': 'Mock Database'
+            }
+
+    return {
+        'success': True,
+        'keyword': keyword,
+        'title': f"General Article for '{keyword}'",
+        'content': f"This is a sample article about {keyword}. In a real implementation, this would be fetched from your article database.",
+        'source': 'Mock Database'
+    }
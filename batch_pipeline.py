@@ -0,0 +1,142 @@
+import io
+import queue
+import threading
+
+from PIL import Image, ImageSequence
+
+# Handle optional PDF support
+try:
+    import pypdfium2 as pdfium
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+PDF_RENDER_DPI = 300
+_DONE = object()
+
+
+def _png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _iter_pdf(name, data):
+    pdf = pdfium.PdfDocument(data)
+    try:
+        for i in range(len(pdf)):
+            page = pdf[i]
+            try:
+                image = page.render(scale=PDF_RENDER_DPI / 72).to_pil()
+            finally:
+                page.close()
+            yield f"{name} – page {i + 1}", _png_bytes(image), None
+    finally:
+        pdf.close()
+
+
+def iter_pages(files):
+    """Yield (label, image_bytes, error) one page at a time.
+
+    Handles plain images, multi-frame TIFFs and (with pypdfium2 installed)
+    PDFs. Pages are decoded lazily so only one page image is held at a time.
+    """
+    for file in files:
+        name = getattr(file, 'name', 'upload')
+        try:
+            data = file.getvalue() if hasattr(file, 'getvalue') else file.read()
+            if name.lower().endswith('.pdf') or data[:5] == b'%PDF-':
+                if not PDF_AVAILABLE:
+                    yield name, None, "PDF support requires pypdfium2 (pip install pypdfium2)"
+                    continue
+                yield from _iter_pdf(name, data)
+                continue
+
+            image = Image.open(io.BytesIO(data))
+            if getattr(image, 'n_frames', 1) == 1:
+                yield name, data, None
+            else:
+                for i, frame in enumerate(ImageSequence.Iterator(image)):
+                    yield f"{name} – page {i + 1}", _png_bytes(frame), None
+        except Exception as e:
+            yield name, None, f"Could not read file: {e}"
+
+
+def run_pipeline(pages, ocr_fn, translate_fn, queue_size=2):
+    """Stream pages through OCR -> translate stages running in their own threads.
+
+    While page N is being translated, page N+1 is already being OCR'd. The
+    bounded queues keep at most `queue_size` pages waiting between stages, so
+    memory stays flat regardless of page count. `translate_fn` returns
+    (translation, warning), with warning None unless part of the page fell
+    back to the original text. Yields one dict per page, in order, with
+    'index', 'label', 'text', 'translation', 'warning' and 'error'.
+    """
+    ocr_queue = queue.Queue(maxsize=queue_size)
+    result_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def ocr_stage():
+        try:
+            for index, (label, data, error) in enumerate(pages):
+                if stop.is_set():
+                    return
+                text = ''
+                if error is None:
+                    try:
+                        text = ocr_fn(data)
+                    except Exception as e:
+                        error = f"OCR failed: {e}"
+                if not put(ocr_queue, {'index': index, 'label': label, 'text': text, 'error': error}):
+                    return
+        finally:
+            put(ocr_queue, _DONE)
+
+    def translate_stage():
+        while True:
+            item = get(ocr_queue)
+            if item is _DONE:
+                put(result_queue, _DONE)
+                return
+            item['translation'] = ''
+            item['warning'] = None
+            if item['text'] and item['error'] is None:
+                try:
+                    item['translation'], item['warning'] = translate_fn(item['text'])
+                except Exception as e:
+                    item['error'] = f"Translation failed: {e}"
+            if not put(result_queue, item):
+                return
+
+    workers = [
+        threading.Thread(target=ocr_stage, name="batch-ocr", daemon=True),
+        threading.Thread(target=translate_stage, name="batch-translate", daemon=True)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        while True:
+            item = get(result_queue)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        # Unblocks both stages if the consumer stops early
+        stop.set()
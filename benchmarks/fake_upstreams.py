@@ -0,0 +1,251 @@
+"""Local stand-ins for Lingva and the MediaWiki API, for offline benchmarks and load tests.
+
+Both servers take a configurable latency (mean plus uniform jitter), error
+rate (HTTP 500) and rate limit (HTTP 429 with Retry-After once the
+per-second budget is spent), and count the requests they serve.
+
+Run standalone and point the apps at them:
+
+    python -m benchmarks.fake_upstreams --lingva-instances 3 --latency 0.1
+    LINGVA_INSTANCES=http://127.0.0.1:8601/api/v1,... WIKIPEDIA_API_URL=http://127.0.0.1:8600/w/api.php streamlit run translated_app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "river valley empire language culture history temple monsoon harvest festival "
+    "railway parliament mountain village science music poetry trade coastal ancient "
+    "dynasty province literature architecture population region capital northern"
+).split()
+
+# Fake MediaWiki redirects; titles starting with "Missing" don't exist
+REDIRECTS = {'UK': 'United Kingdom', 'Bharat': 'India'}
+# Every fake article's outline as (index, level, number): two sections with a subsection each, then one without
+SECTIONS = [(1, 2, '1'), (2, 3, '1.1'), (3, 2, '2'), (4, 3, '2.1'), (5, 2, '3')]
+
+
+def article_text(title, sentences=40):
+    """Deterministic pseudo-article prose for a title, so runs are comparable"""
+    rng = random.Random(title)
+    lines = []
+    for _ in range(sentences):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+        lines.append(f"The {' '.join(words)} of {title} is well known.")
+    return ' '.join(lines)
+
+
+class Behaviour:
+    """Latency, failure and rate-limit settings shared by a server's request handlers"""
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.not_modified = 0
+        self._window = 0
+        self._window_count = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+
+    def admit(self):
+        """Returns an HTTP status to fail with, or None to serve the request normally"""
+        with self._lock:
+            self.requests += 1
+            now = int(time.monotonic())
+            if now != self._window:
+                self._window, self._window_count = now, 0
+            self._window_count += 1
+            if self.rate_limit and self._window_count > self.rate_limit:
+                self.throttled += 1
+                return 429
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay)
+        return 500 if failed else None
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'errors': self.errors, 'throttled': self.throttled}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    behaviour = None
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            return self._reply(200, self.behaviour.stats())
+        status = self.behaviour.admit()
+        if status == 429:
+            return self._reply(429, {'error': 'Too many requests'}, {'Retry-After': '1'})
+        if status:
+            return self._reply(status, {'error': 'Injected failure'})
+        self.send_payload(self.respond())
+
+    def send_payload(self, payload):
+        self._reply(200, payload)
+
+
+class FakeLingvaHandler(_Handler):
+    """Serves /api/v1/<source>/<target>/<text>, 'translating' each line by tagging it with the target"""
+
+    def respond(self):
+        parts = self.path.split('/', 5)
+        if len(parts) < 6:
+            return {'error': 'Bad path'}
+        target = parts[4]
+        text = urllib.parse.unquote(parts[5])
+        return {'translation': '\n'.join(f"[{target}] {line}" for line in text.split('\n'))}
+
+
+class FakeWikipediaHandler(_Handler):
+    """Answers the MediaWiki queries WikipediaClient makes.
+
+    Titles follow REDIRECTS and are at revision 1 unless `revisions` (title ->
+    revision, set by a test to simulate an edit) says otherwise. Parse results
+    carry an ETag of their content and are answered 304 when it still matches.
+    """
+
+    revisions = None
+
+    def send_payload(self, payload):
+        if 'parse' not in payload:
+            return self._reply(200, payload)
+        etag = '"' + hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16] + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.behaviour.count_not_modified()
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self._reply(200, payload, {'ETag': etag})
+
+    def respond(self):
+        query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        if query.get('action') == 'query':
+            pages = []
+            redirects = []
+            for title in query.get('titles', '').split('|'):
+                if title in REDIRECTS:
+                    redirects.append({'from': title, 'to': REDIRECTS[title]})
+                    title = REDIRECTS[title]
+                if title.startswith('Missing'):
+                    pages.append({'title': title, 'missing': True})
+                    continue
+                page = {'title': title, 'lastrevid': (self.revisions or {}).get(title, 1)}
+                if 'extracts' in query.get('prop', ''):
+                    page['extract'] = article_text(title)
+                pages.append(page)
+            return {'query': {'pages': pages, 'redirects': redirects}}
+        title = query.get('page', '')
+        if query.get('section'):
+            # Like MediaWiki, a section comes with its heading and all of its subsections
+            start = int(query['section'])
+            level = SECTIONS[start - 1][1]
+            html = []
+            for index, section_level, _ in SECTIONS[start - 1:]:
+                if index != start and section_level <= level:
+                    break
+                html.append(
+                    f'<div class="mw-heading mw-heading{section_level}"><h{section_level}>Section {index}</h{section_level}></div>'
+                    f"<p>{article_text(f'{title} {index}', 10)}</p>"
+                )
+            return {'parse': {'title': title, 'text': ''.join(html)}}
+        return {'parse': {'title': title, 'revid': 1, 'sections': [
+            {'index': str(i), 'line': f"Section {i}", 'level': str(level), 'number': number} for i, level, number in SECTIONS
+        ]}}
+
+
+class FakeServer:
+    """A fake upstream running on a background thread"""
+
+    def __init__(self, handler, behaviour, host='127.0.0.1', port=0):
+        self.revisions = {}
+        handler = type(handler.__name__, (handler,), {'behaviour': behaviour, 'revisions': self.revisions})
+        self.behaviour = behaviour
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_upstreams(lingva_instances=3, wikipedia_port=0, lingva_port=0, **behaviour):
+    """Start one fake MediaWiki and `lingva_instances` fake Lingva servers.
+
+    Returns (lingva_servers, wikipedia_server). With non-zero ports the
+    servers bind consecutive ports starting there.
+    """
+    wikipedia = FakeServer(FakeWikipediaHandler, Behaviour(latency=behaviour.get('latency', 0.05)), port=wikipedia_port).start()
+    lingva = [
+        FakeServer(FakeLingvaHandler, Behaviour(**behaviour), port=lingva_port + i if lingva_port else 0).start()
+        for i in range(lingva_instances)
+    ]
+    return lingva, wikipedia
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fake Lingva and MediaWiki servers")
+    parser.add_argument('--lingva-instances', type=int, default=3)
+    parser.add_argument('--wikipedia-port', type=int, default=8600)
+    parser.add_argument('--lingva-port', type=int, default=8601)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds per request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra uniform random latency, in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of Lingva requests answered with 500")
+    parser.add_argument('--rate-limit', type=int, default=0, help="Lingva requests per second per instance before 429 (0 = unlimited)")
+    args = parser.parse_args()
+
+    lingva, wikipedia = start_upstreams(
+        args.lingva_instances, args.wikipedia_port, args.lingva_port,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, rate_limit=args.rate_limit
+    )
+    print(f"WIKIPEDIA_API_URL={wikipedia.url}/w/api.php")
+    print(f"LINGVA_INSTANCES={','.join(server.url + '/api/v1' for server in lingva)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
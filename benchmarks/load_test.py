@@ -0,0 +1,273 @@
+"""Load test UniversalTranslator and the Flask API against local fake upstreams.
+
+Starts fake Lingva and MediaWiki servers (see fake_upstreams.py), points the
+apps at them through LINGVA_INSTANCES / WIKIPEDIA_API_URL, and runs each
+workload with a fresh translation memory and Wikipedia cache:
+
+    short  one unique phrase per request
+    long   one article (~40 sentences) per request; direct fetches it via the Wikipedia client
+    batch  /translate-batch with 50 phrases, half of them duplicates (Flask only)
+
+Prints (or writes with --output) one JSON document with p50/p95/p99
+latency, requests/s and upstream calls per request for every
+target/workload pair. Keys and rounding are stable so results from
+different commits can be diffed directly.
+
+    python -m benchmarks.load_test --requests 200 --concurrency 16 --output bench.json
+    python -m benchmarks.load_test --instance-qps 100 --error-rate 0.05 --rate-limit 20
+"""
+import argparse
+import importlib.machinery
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_upstreams import WORDS, article_text, start_upstreams
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET_LANG = 'hi'
+BATCH_SIZE = 50
+
+
+def phrase(i):
+    rng = random.Random(i)
+    return f"The {' '.join(rng.choice(WORDS) for _ in range(6))} number {i} is here."
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Upstreams:
+    def __init__(self, lingva, wikipedia):
+        self.lingva = lingva
+        self.wikipedia = wikipedia
+
+    def totals(self):
+        totals = {'requests': 0, 'errors': 0, 'throttled': 0}
+        for server in self.lingva:
+            for key, value in server.behaviour.stats().items():
+                totals[key] += value
+        return totals
+
+
+def run_workload(target, workload, call, count, concurrency, upstreams):
+    """Run `call(i)` for i in range(count) with `concurrency` threads and summarize"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = call(i)
+        except Exception as e:
+            logging.debug(f"{target}/{workload} request {i} failed: {e}")
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    before = upstreams.totals()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(count)))
+    wall = time.perf_counter() - start
+    after = upstreams.totals()
+
+    latencies.sort()
+    upstream = {key: after[key] - before[key] for key in after}
+    return {
+        'target': target,
+        'workload': workload,
+        'requests': count,
+        'concurrency': concurrency,
+        'errors': errors,
+        'wall_s': round(wall, 3),
+        'req_per_s': round(count / wall, 2) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        'upstream_calls': upstream['requests'],
+        'upstream_calls_per_request': round(upstream['requests'] / count, 3) if count else 0.0,
+        'upstream_errors': upstream['errors'],
+        'upstream_throttled': upstream['throttled']
+    }
+
+
+def fresh_state(workdir, name):
+    from translation_memory import TranslationMemory
+    from wikipedia_client import WikipediaClient
+    return (
+        TranslationMemory(db_path=os.path.join(workdir, f"{name}-memory.sqlite3")),
+        WikipediaClient(cache_path=os.path.join(workdir, f"{name}-wikipedia.sqlite3"))
+    )
+
+
+def run_direct(workloads, count, concurrency, upstreams, workdir, instance_qps):
+    import translated_app
+
+    results = []
+    for workload in workloads:
+        if workload == 'batch':
+            continue
+        translator = translated_app.UniversalTranslator(instance_qps=instance_qps)
+        translator.memory, translator.wikipedia = fresh_state(workdir, f"direct-{workload}")
+
+        if workload == 'short':
+            def call(i):
+                return not translator.translate_text(phrase(i), 'en', TARGET_LANG).startswith('Translation unavailable')
+        else:
+            def call(i):
+                article = translator.fetch_wikipedia_article(f"Article {i}")
+                # stream_long_content is what the Wikipedia tab renders; it draws no widgets
+                return bool(article) and bool(''.join(translator.stream_long_content(article['content'], TARGET_LANG, 'en')))
+
+        results.append(run_workload('direct', workload, call, count, concurrency, upstreams))
+    return results
+
+
+def load_flask_module():
+    loader = importlib.machinery.SourceFileLoader('translation_server', os.path.join(REPO_ROOT, 'translation'))
+    spec = importlib.util.spec_from_loader('translation_server', loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def run_flask(workloads, count, concurrency, upstreams, workdir, instance_qps):
+    from werkzeug.serving import make_server
+
+    server_module = load_flask_module()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    httpd = make_server('127.0.0.1', 0, server_module.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_port}"
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    results = []
+    try:
+        for workload in workloads:
+            server_module.translator = server_module.ArticleTranslator(instance_qps=instance_qps)
+            server_module.translator.memory, _ = fresh_state(workdir, f"flask-{workload}")
+
+            if workload == 'short':
+                def call(i):
+                    response = session.post(f"{base}/translate-sentence", json={'sentence': phrase(i), 'language': TARGET_LANG})
+                    return response.status_code == 200
+            elif workload == 'long':
+                def call(i):
+                    response = session.post(f"{base}/translate", json={'text': article_text(f"Article {i}"), 'target_lang': TARGET_LANG})
+                    return response.status_code == 200
+            else:
+                def call(i):
+                    items = [phrase(i * BATCH_SIZE + j % (BATCH_SIZE // 2)) for j in range(BATCH_SIZE)]
+                    response = session.post(f"{base}/translate-batch", json={'items': items, 'target_lang': TARGET_LANG})
+                    return response.status_code == 200 and all(r['status'] != 'error' for r in response.json()['results'])
+
+            results.append(run_workload('flask', workload, call, count, concurrency, upstreams))
+    finally:
+        httpd.shutdown()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the translators against local fake upstreams")
+    parser.add_argument('--targets', default='direct,flask', help="Comma-separated: direct, flask")
+    parser.add_argument('--workloads', default='short,long,batch', help="Comma-separated: short, long, batch")
+    parser.add_argument('--requests', type=int, default=100, help="Requests per workload")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--lingva-instances', type=int, default=3)
+    parser.add_argument('--instance-qps', type=float, default=2.0,
+                        help="Client-side rate limit per instance (raise it to measure app overhead rather than throttling)")
+    parser.add_argument('--latency', type=float, default=0.05, help="Fake upstream latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="Extra uniform random latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of Lingva requests failing with 500")
+    parser.add_argument('--rate-limit', type=int, default=0, help="Lingva requests/s per instance before 429 (0 = unlimited)")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+    workloads = [w.strip() for w in args.workloads.split(',') if w.strip()]
+    config = {
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'lingva_instances': args.lingva_instances,
+        'instance_qps': args.instance_qps,
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate,
+        'rate_limit': args.rate_limit,
+        'target_lang': TARGET_LANG
+    }
+
+    lingva, wikipedia = start_upstreams(
+        args.lingva_instances, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, rate_limit=args.rate_limit
+    )
+    upstreams = Upstreams(lingva, wikipedia)
+    workdir = tempfile.mkdtemp(prefix='wikitranslate-bench-')
+    # The apps read these at import time, so they must be set before the first import below
+    os.environ['LINGVA_INSTANCES'] = ','.join(server.url + '/api/v1' for server in lingva)
+    os.environ['WIKIPEDIA_API_URL'] = wikipedia.url + '/w/api.php'
+    os.environ['TRANSLATION_MEMORY_PATH'] = os.path.join(workdir, 'memory.sqlite3')
+    os.environ['WIKIPEDIA_CACHE_PATH'] = os.path.join(workdir, 'wikipedia.sqlite3')
+    # The benchmark never submits jobs, so keep the Flask job queue's database here and run no workers
+    os.environ['TRANSLATION_JOBS_PATH'] = os.path.join(workdir, 'jobs.sqlite3')
+    os.environ['TRANSLATION_INTERACTIVE_WORKERS'] = '0'
+    os.environ['TRANSLATION_JOB_WORKERS'] = '0'
+    sys.path.insert(0, REPO_ROOT)
+
+    results = []
+    if 'direct' in targets:
+        results.extend(run_direct(workloads, args.requests, args.concurrency, upstreams, workdir, args.instance_qps))
+    if 'flask' in targets:
+        results.extend(run_flask(workloads, args.requests, args.concurrency, upstreams, workdir, args.instance_qps))
+    # The apps configure INFO logging on import; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'config': config,
+        'results': results
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Micro-benchmark: sentence segmentation and chunk packing on ~1 MB of mixed-script text.
+
+Run from the repository root:
+
+    python -m benchmarks.segmentation_bench
+"""
+import re
+import time
+
+from segmentation import pack_sentences, segment
+
+PARAGRAPHS = [
+    "Dr. Smith visited the U.S. capital on Jan. 5 and met Mr. Jones, e.g. at the museum. "
+    "The exhibition was crowded! Was it worth it? Most visitors said yes.",
+    "भारत दक्षिण एशिया में स्थित एक विशाल देश है। इसकी राजधानी नई दिल्ली है। यहाँ अनेक भाषाएँ बोली जाती हैं।",
+    "这是一个测试句子。它没有空格！真的吗？是的。",
+    "A very long run-on sentence without any full stop, " * 40 + "finally ending here."
+]
+
+
+def build_input(size=1024 * 1024):
+    parts = []
+    length = 0
+    while length < size:
+        for paragraph in PARAGRAPHS:
+            parts.append(paragraph)
+            length += len(paragraph) + 2
+    return '\n\n'.join(parts)
+
+
+def legacy_split(text):
+    # The replace-based splitter the Streamlit app used before segmentation.py
+    for mark in ('. ', '! ', '? '):
+        text = text.replace(mark, mark[0] + '|SPLIT|')
+    for mark in ('.\n', '!\n', '?\n'):
+        text = text.replace(mark, mark[0] + '|SPLIT|')
+    return [s.strip() for s in text.split('|SPLIT|') if s.strip()]
+
+
+def legacy_flask_split(text):
+    return [s for s in re.split(r'(?<=[.!?]) +', text) if s.strip()]
+
+
+def legacy_pack(sentences, chunk_size):
+    # String-concatenating packer the Streamlit app used before the translation memory
+    chunks = []
+    current_chunk = ""
+    for sentence in sentences:
+        if len(current_chunk + " " + sentence) < chunk_size:
+            current_chunk += " " + sentence if current_chunk else sentence
+        else:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+            current_chunk = sentence
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def timed(label, fn, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<34} {best * 1000:8.1f} ms  ({len(result)} items)")
+    return result
+
+
+def main():
+    text = build_input()
+    print(f"Input: {len(text) / 1024:.0f} KiB\n")
+
+    legacy = timed("legacy replace split", legacy_split, text)
+    timed("legacy flask re.split", legacy_flask_split, text)
+    timed("legacy string-concat pack (700)", legacy_pack, legacy, 700)
+
+    sentences = timed("segment (700)", segment, text, 700)
+    timed("pack_sentences (700)", pack_sentences, list(enumerate(sentences)), 700)
+
+    print(f"\nLongest legacy sentence: {max(map(len, legacy))} chars "
+          f"(anything over 1000 was truncated upstream)")
+    print(f"Longest segment:         {max(map(len, sentences))} chars")
+
+
+if __name__ == '__main__':
+    main()
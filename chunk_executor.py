@@ -0,0 +1,85 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class ChunkExecutor:
+    """Translate chunks with bounded concurrency while keeping their order.
+
+    One thread pool lives as long as the executor and is shared by every
+    call; each call keeps at most `max_concurrency` of its chunks running.
+    `max_workers` (by default four times that) bounds the threads used by
+    all concurrent calls together. Call shutdown() when done with it.
+    """
+
+    def __init__(self, max_concurrency=4, max_workers=None):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_workers = max_workers or 4 * self.max_concurrency
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="chunk")
+
+    def shutdown(self, wait=True):
+        """Stop the worker threads, dropping chunks that haven't started"""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _run_all(self, run, total):
+        """Run run(index) for every index on the shared pool; yields (index, future) as each finishes"""
+        running = {}
+        submitted = 0
+        try:
+            while running or submitted < total:
+                while submitted < total and len(running) < self.max_concurrency:
+                    # Each chunk runs in a copy of the caller's context so per-request traces follow it
+                    running[self._pool.submit(contextvars.copy_context().run, run, submitted)] = submitted
+                    submitted += 1
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield running.pop(future), future
+        finally:
+            # Drop queued chunks if the caller stops early
+            for future in running:
+                future.cancel()
+
+    def map(self, translate_fn, chunks, on_done=None):
+        """Call translate_fn(chunk) for every chunk.
+
+        Returns (results, timings) in the original chunk order. `on_done`
+        is called from the calling thread as (completed, total, index, seconds)
+        whenever a chunk finishes, so it is safe to update UI from it.
+        """
+        total = len(chunks)
+        results = [None] * total
+        timings = [0.0] * total
+
+        def run(index):
+            start = time.perf_counter()
+            try:
+                results[index] = translate_fn(chunks[index])
+            finally:
+                timings[index] = time.perf_counter() - start
+
+        for completed, (index, future) in enumerate(self._run_all(run, total), 1):
+            future.result()
+            if on_done:
+                on_done(completed, total, index, timings[index])
+
+        return results, timings
+
+    def imap(self, translate_fn, chunks):
+        """Yield (index, result, seconds) in chunk order, each as soon as it and every earlier chunk is done"""
+        def run(index):
+            start = time.perf_counter()
+            result = translate_fn(chunks[index])
+            return result, time.perf_counter() - start
+
+        finished = {}
+        next_index = 0
+        completions = self._run_all(run, len(chunks))
+        try:
+            for index, future in completions:
+                finished[index] = future
+                while next_index in finished:
+                    result, seconds = finished.pop(next_index).result()
+                    yield next_index, result, seconds
+                    next_index += 1
+        finally:
+            completions.close()
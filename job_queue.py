@@ -0,0 +1,536 @@
+"""Persistent queue for translation jobs too large to run inside a request.
+
+A submitted text is split into pieces of whole sentences and stored in
+SQLite; workers claim jobs and store each piece's translation as soon as
+it is done, so clients can poll for partial results and a restarted worker
+carries on from the first unfinished piece. Pieces are translated through
+the servers' usual long-text path, so their sentences also land in the
+translation memory.
+
+Jobs run in one of two lanes. Short texts go to 'interactive', which has
+workers of its own, so they never wait behind article-sized 'bulk' jobs;
+bulk workers take waiting interactive jobs first.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import metrics
+from segmentation import pack_sentences, segment_lines
+
+DEFAULT_DB_PATH = os.environ.get('TRANSLATION_JOBS_PATH', 'translation_jobs.sqlite3')
+
+LANES = ('interactive', 'bulk')
+# Longest text that may run in the interactive lane
+INTERACTIVE_MAX_CHARS = 2000
+# Characters per stored piece; each is translated (in chunks) and saved on its own
+PIECE_CHARS = 4000
+# Matches the servers' long-text chunk size, so pieces segment into the same sentences
+CHUNK_SIZE = 800
+MAX_ATTEMPTS = 3
+LEASE_SECONDS = 120
+# Workers renew their leases this often, so a long piece never outlives its lease
+HEARTBEAT_SECONDS = LEASE_SECONDS / 4
+# A failed attempt waits RETRY_DELAY * attempts before it can be claimed again
+RETRY_DELAY = 30
+POLL_INTERVAL = 1.0
+JOB_TTL = 7 * 24 * 3600
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+class PieceFailed(Exception):
+    """Raised by a translate_fn when part of a piece could not be translated"""
+
+
+def split_pieces(text, piece_chars=PIECE_CHARS):
+    """Split text into pieces of whole sentences, each at most piece_chars long.
+
+    Each piece ends with the space, line or paragraph break that followed it
+    in the text, so the pieces concatenate back to the same layout.
+    """
+    sentences, separators = segment_lines(text, CHUNK_SIZE)
+    return [
+        ''.join(s + separators[i] for i, s in group)
+        for group in pack_sentences(list(enumerate(sentences)), piece_chars)
+    ]
+
+
+def _with_separator(text, translation):
+    """A piece's translation followed by the break its source text ended with"""
+    return translation.rstrip() + text[len(text.rstrip()):]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class JobStore:
+    """SQLite tables holding jobs, their pieces and which worker process owns each running job"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, lane TEXT NOT NULL, status TEXT NOT NULL,"
+            " source TEXT NOT NULL, target TEXT NOT NULL, meta TEXT, pieces INTEGER NOT NULL,"
+            " completed INTEGER NOT NULL DEFAULT 0, owner TEXT, lease_until REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, error TEXT,"
+            " created REAL NOT NULL, started REAL, updated REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, lane, created)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_fingerprint ON jobs (fingerprint)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_pieces ("
+            " job_id TEXT NOT NULL, idx INTEGER NOT NULL, text TEXT NOT NULL, translation TEXT,"
+            " PRIMARY KEY (job_id, idx))"
+        )
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def submit(self, text, source_lang, target_lang, lane, meta=None):
+        """Store a new job, or return the live one for identical input.
+
+        Returns (job, created). A client retrying a submit that timed out
+        gets the original job back instead of queueing the work twice.
+        """
+        fingerprint = hashlib.sha256('\0'.join((source_lang, target_lang, text)).encode('utf-8')).hexdigest()
+        pieces = split_pieces(text)
+        now = time.time()
+
+        def insert(conn):
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE fingerprint=? AND status IN ('queued', 'running', 'done') AND created>?"
+                " ORDER BY created DESC LIMIT 1",
+                (fingerprint, now - JOB_TTL)
+            ).fetchone()
+            if row:
+                return row['id'], False
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, fingerprint, lane, status, source, target, meta, pieces, created, updated)"
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, fingerprint, lane, source_lang, target_lang, json.dumps(meta or {}), len(pieces), now, now)
+            )
+            conn.executemany(
+                "INSERT INTO job_pieces (job_id, idx, text) VALUES (?, ?, ?)",
+                [(job_id, i, piece) for i, piece in enumerate(pieces)]
+            )
+            return job_id, True
+
+        job_id, created = self._transaction(insert)
+        return self.get(job_id), created
+
+    def claim(self, owner, lanes):
+        """Take the oldest waiting job in `lanes` (earlier lanes first), or one whose owner's lease ran out.
+
+        A queued job's lease_until, when set, is the end of its retry delay.
+        """
+        now = time.time()
+        placeholders = ','.join('?' * len(lanes))
+        order = ' '.join(f"WHEN ? THEN {i}" for i in range(len(lanes)))
+
+        def take(conn):
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE lane IN ({placeholders})"
+                " AND (status='queued' OR status='running') AND (lease_until IS NULL OR lease_until<?)"
+                f" ORDER BY CASE lane {order} END, created LIMIT 1",
+                (*lanes, now, *lanes)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status='running', owner=?, lease_until=?, started=COALESCE(started, ?), updated=?"
+                " WHERE id=?",
+                (owner, now + LEASE_SECONDS, now, now, row['id'])
+            )
+            return row['id']
+
+        job_id = self._transaction(take)
+        return self.get(job_id) if job_id else None
+
+    def pending_pieces(self, job_id):
+        return [
+            (row['idx'], row['text']) for row in self._connection().execute(
+                "SELECT idx, text FROM job_pieces WHERE job_id=? AND translation IS NULL ORDER BY idx", (job_id,)
+            )
+        ]
+
+    def save_piece(self, job_id, index, translation, owner):
+        """Store a finished piece and renew the lease; False if the job was cancelled or taken over"""
+        now = time.time()
+
+        def save(conn):
+            updated = conn.execute(
+                "UPDATE jobs SET completed=completed+1, lease_until=?, updated=? WHERE id=? AND owner=? AND status='running'",
+                (now + LEASE_SECONDS, now, job_id, owner)
+            ).rowcount
+            if updated:
+                conn.execute(
+                    "UPDATE job_pieces SET translation=? WHERE job_id=? AND idx=?", (translation, job_id, index)
+                )
+            return bool(updated)
+
+        return self._transaction(save)
+
+    def renew(self, owner):
+        """Extend the lease on every job `owner` is running; returns how many were renewed"""
+        now = time.time()
+        return self._connection().execute(
+            "UPDATE jobs SET lease_until=? WHERE owner=? AND status='running'", (now + LEASE_SECONDS, owner)
+        ).rowcount
+
+    def finish(self, job_id, owner, status, error=None):
+        self._connection().execute(
+            "UPDATE jobs SET status=?, error=?, owner=NULL, lease_until=NULL, updated=? WHERE id=? AND owner=? AND status='running'",
+            (status, error, time.time(), job_id, owner)
+        )
+
+    def retry(self, job_id, owner, error):
+        """Give a failed attempt back to the queue after a delay, or fail the job after MAX_ATTEMPTS.
+
+        Finished pieces are kept, so the next attempt resumes at the first unfinished one. Returns the new status.
+        """
+        def update(conn):
+            row = conn.execute("SELECT attempts FROM jobs WHERE id=? AND owner=? AND status='running'", (job_id, owner)).fetchone()
+            if row is None:
+                return None
+            attempts = row['attempts'] + 1
+            status = 'failed' if attempts >= MAX_ATTEMPTS else 'queued'
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status=?, attempts=?, error=?, owner=NULL, lease_until=?, updated=? WHERE id=?",
+                (status, attempts, error, now + RETRY_DELAY * attempts if status == 'queued' else None, now, job_id)
+            )
+            return status
+
+        return self._transaction(update)
+
+    def release(self, job_id, owner):
+        """Hand a running job back to the queue as it is (e.g. on shutdown); finished pieces are kept"""
+        return bool(self._connection().execute(
+            "UPDATE jobs SET status='queued', owner=NULL, lease_until=NULL, updated=? WHERE id=? AND owner=? AND status='running'",
+            (time.time(), job_id, owner)
+        ).rowcount)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; False if it doesn't exist or has already finished"""
+        return bool(self._connection().execute(
+            "UPDATE jobs SET status='cancelled', owner=NULL, lease_until=NULL, updated=? WHERE id=? AND status IN ('queued', 'running')",
+            (time.time(), job_id)
+        ).rowcount)
+
+    def release_orphans(self, host):
+        """Requeue running jobs owned by processes on this host that no longer exist (e.g. before a restart)"""
+        released = 0
+        for row in self._connection().execute(
+            "SELECT id, owner FROM jobs WHERE status='running' AND owner LIKE ?", (host + ':%',)
+        ).fetchall():
+            pid = row['owner'].rsplit(':', 1)[1]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                released += self._connection().execute(
+                    "UPDATE jobs SET status='queued', owner=NULL, lease_until=NULL WHERE id=? AND owner=?",
+                    (row['id'], row['owner'])
+                ).rowcount
+        return released
+
+    def purge(self, max_age=JOB_TTL):
+        """Delete finished jobs older than max_age seconds"""
+        cutoff = time.time() - max_age
+
+        def delete(conn):
+            ids = [(row['id'],) for row in conn.execute(
+                "SELECT id FROM jobs WHERE updated<? AND status IN ('done', 'failed', 'cancelled')", (cutoff,)
+            )]
+            conn.executemany("DELETE FROM job_pieces WHERE job_id=?", ids)
+            conn.executemany("DELETE FROM jobs WHERE id=?", ids)
+            return len(ids)
+
+        return self._transaction(delete)
+
+    def get(self, job_id):
+        row = self._connection().execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def pieces(self, job_id, since=0):
+        """Finished pieces from index `since` on, as (index, translation) in order.
+
+        Translations concatenate to the whole translated text.
+        """
+        return [
+            (row['idx'], _with_separator(row['text'], row['translation'])) for row in self._connection().execute(
+                "SELECT idx, text, translation FROM job_pieces WHERE job_id=? AND idx>=? AND translation IS NOT NULL ORDER BY idx",
+                (job_id, since)
+            )
+        ]
+
+    def status(self, job_id, since=0):
+        """Client-facing view of a job with the pieces finished from `since` on, or None"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        pieces = self.pieces(job_id, since)
+        result = {
+            'job_id': job['id'],
+            'status': job['status'],
+            'priority': job['lane'],
+            'source_language': job['source'],
+            'target_language': job['target'],
+            'progress': {'completed': job['completed'], 'total': job['pieces']},
+            'pieces': [{'index': index, 'translated_text': text} for index, text in pieces],
+            'created': job['created'],
+            'updated': job['updated']
+        }
+        if job['status'] == 'done' and not since:
+            result['translated_text'] = ''.join(text for _, text in pieces)
+        if job['error']:
+            result['error'] = job['error']
+        result.update(json.loads(job['meta'] or '{}'))
+        return result
+
+    def counts(self):
+        """{lane: {status: jobs}} for the queue's current contents"""
+        counts = {lane: {} for lane in LANES}
+        for row in self._connection().execute("SELECT lane, status, COUNT(*) AS n FROM jobs GROUP BY lane, status"):
+            counts.setdefault(row['lane'], {})[row['status']] = row['n']
+        return counts
+
+
+def choose_lane(text, priority=None):
+    """The lane a job runs in; texts over INTERACTIVE_MAX_CHARS always go to 'bulk'"""
+    if len(text) > INTERACTIVE_MAX_CHARS:
+        return 'bulk'
+    return priority if priority in LANES else 'interactive'
+
+
+class _JobQueueBase:
+    def __init__(self, store, translate_fn, interactive_workers=2, bulk_workers=2):
+        self.store = store
+        self.translate_fn = translate_fn
+        # Zero workers in both lanes leaves jobs queued for another process to run
+        self.interactive_workers = max(0, int(interactive_workers))
+        self.bulk_workers = max(0, int(bulk_workers))
+        self.host = socket.gethostname()
+        self.owner = f"{self.host}:{os.getpid()}"
+        self.started = False
+
+    def _worker_lanes(self):
+        # Interactive workers never pick up bulk jobs; bulk workers help with interactive ones first
+        return [('interactive',)] * self.interactive_workers + [LANES] * self.bulk_workers
+
+    def _heartbeat(self):
+        try:
+            self.store.renew(self.owner)
+        except sqlite3.Error as e:
+            logging.error(f"Job queue: lease renewal failed: {e}")
+
+    def _recover(self):
+        released = self.store.release_orphans(self.host)
+        purged = self.store.purge()
+        if released or purged:
+            logging.info(f"Job queue: resumed {released} interrupted jobs, purged {purged} old ones")
+
+    def _claimed(self, job):
+        metrics.observe('job_wait_seconds', time.time() - job['created'], lane=job['lane'])
+        logging.info(f"Job {job['id']} ({job['lane']}) started: {job['completed']}/{job['pieces']} pieces already done")
+
+    def _finished(self, job, status):
+        metrics.inc('jobs_total', lane=job['lane'], status=status)
+        logging.info(f"Job {job['id']} {status}")
+
+    def _failed(self, job, status, error):
+        if status == 'queued':
+            logging.warning(f"Job {job['id']} attempt failed, requeued: {error}")
+        elif status == 'failed':
+            metrics.inc('jobs_total', lane=job['lane'], status=status)
+            logging.error(f"Job {job['id']} failed after {MAX_ATTEMPTS} attempts: {error}")
+
+
+class JobQueue(_JobQueueBase):
+    """Thread workers for the Flask server.
+
+    `translate_fn(text, source_lang, target_lang)` returns a string, or raises
+    (e.g. PieceFailed) so the attempt is retried.
+    """
+
+    def __init__(self, store, translate_fn, interactive_workers=2, bulk_workers=2):
+        super().__init__(store, translate_fn, interactive_workers, bulk_workers)
+        self._wakeup = threading.Condition()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Resume interrupted jobs and start the workers; later calls do nothing"""
+        with self._lock:
+            if self.started or not self._worker_lanes():
+                return
+            self.started = True
+        self._recover()
+        for i, lanes in enumerate(self._worker_lanes()):
+            threading.Thread(target=self._work, args=(lanes,), name=f"job-{lanes[0]}-{i}", daemon=True).start()
+        threading.Thread(target=self._beat, name="job-heartbeat", daemon=True).start()
+
+    def _beat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            self._heartbeat()
+
+    def submit(self, text, source_lang, target_lang, priority=None, meta=None):
+        job, created = self.store.submit(text, source_lang, target_lang, choose_lane(text, priority), meta)
+        if created:
+            with self._wakeup:
+                self._wakeup.notify_all()
+        return job, created
+
+    def _work(self, lanes):
+        while True:
+            try:
+                job = self.store.claim(self.owner, lanes)
+            except sqlite3.Error as e:
+                logging.error(f"Job queue: claim failed: {e}")
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(POLL_INTERVAL)
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        self._claimed(job)
+        try:
+            for index, text in self.store.pending_pieces(job['id']):
+                translation = self.translate_fn(text, job['source'], job['target'])
+                if not self.store.save_piece(job['id'], index, translation, self.owner):
+                    logging.info(f"Job {job['id']} stopped: cancelled or taken over")
+                    return
+        except Exception as e:
+            self._failed(job, self.store.retry(job['id'], self.owner, str(e)), e)
+            return
+        self.store.finish(job['id'], self.owner, 'done')
+        self._finished(job, 'done')
+
+
+class AsyncJobQueue(_JobQueueBase):
+    """asyncio counterpart of JobQueue; `translate_fn` is a coroutine function that may raise PieceFailed.
+
+    SQLite calls run in the default executor so the event loop never blocks on the database.
+    """
+
+    def __init__(self, store, translate_fn, interactive_workers=2, bulk_workers=2):
+        super().__init__(store, translate_fn, interactive_workers, bulk_workers)
+        self._wakeup = None
+        self._tasks = []
+        self.draining = False
+
+    async def start(self):
+        if self.started or not self._worker_lanes():
+            return
+        self.started = True
+        self._wakeup = asyncio.Condition()
+        await asyncio.to_thread(self._recover)
+        self._tasks = [asyncio.ensure_future(self._work(lanes)) for lanes in self._worker_lanes()]
+        self._tasks.append(asyncio.ensure_future(self._beat()))
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            await asyncio.to_thread(self._heartbeat)
+
+    async def drain(self, timeout):
+        """Stop claiming jobs and let each worker finish the piece it is on, waiting up to `timeout` seconds.
+
+        Jobs left unfinished go back to the queue with their finished pieces,
+        so another process (or this one, restarted) carries on from there.
+        """
+        self.draining = True
+        # The last task is the heartbeat, which keeps the leases of jobs still running
+        workers = self._tasks[:-1]
+        if not workers:
+            return
+        async with self._wakeup:
+            self._wakeup.notify_all()
+        await asyncio.wait(workers, timeout=timeout)
+
+    async def close(self):
+        # Jobs still running (drain timed out) stay 'running' under this process and are resumed after the restart
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, text, source_lang, target_lang, priority=None, meta=None):
+        job, created = await asyncio.to_thread(
+            self.store.submit, text, source_lang, target_lang, choose_lane(text, priority), meta
+        )
+        if created and self._wakeup is not None:
+            async with self._wakeup:
+                self._wakeup.notify_all()
+        return job, created
+
+    async def _work(self, lanes):
+        while not self.draining:
+            try:
+                job = await asyncio.to_thread(self.store.claim, self.owner, lanes)
+            except sqlite3.Error as e:
+                logging.error(f"Job queue: claim failed: {e}")
+                job = None
+            if job is None:
+                async with self._wakeup:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job):
+        self._claimed(job)
+        try:
+            for index, text in await asyncio.to_thread(self.store.pending_pieces, job['id']):
+                if self.draining:
+                    await asyncio.to_thread(self.store.release, job['id'], self.owner)
+                    logging.info(f"Job {job['id']} released for another worker: shutting down")
+                    return
+                translation = await self.translate_fn(text, job['source'], job['target'])
+                if not await asyncio.to_thread(self.store.save_piece, job['id'], index, translation, self.owner):
+                    logging.info(f"Job {job['id']} stopped: cancelled or taken over")
+                    return
+        except Exception as e:
+            self._failed(job, await asyncio.to_thread(self.store.retry, job['id'], self.owner, str(e)), e)
+            return
+        await asyncio.to_thread(self.store.finish, job['id'], self.owner, 'done')
+        self._finished(job, 'done')
@@ -0,0 +1,185 @@
+import bisect
+import re
+
+# Unicode blocks -> script, sorted by start so lookups can bisect
+_SCRIPT_RANGES = [
+    (0x0041, 0x024F, 'Latin'),
+    (0x0370, 0x03FF, 'Greek'),
+    (0x0400, 0x04FF, 'Cyrillic'),
+    (0x0600, 0x06FF, 'Arabic'),
+    (0x0750, 0x077F, 'Arabic'),
+    (0x0900, 0x097F, 'Devanagari'),
+    (0x0980, 0x09FF, 'Bengali'),
+    (0x0A00, 0x0A7F, 'Gurmukhi'),
+    (0x0A80, 0x0AFF, 'Gujarati'),
+    (0x0B00, 0x0B7F, 'Oriya'),
+    (0x0B80, 0x0BFF, 'Tamil'),
+    (0x0C00, 0x0C7F, 'Telugu'),
+    (0x0C80, 0x0CFF, 'Kannada'),
+    (0x0D00, 0x0D7F, 'Malayalam'),
+    (0x0D80, 0x0DFF, 'Sinhala'),
+    (0x1100, 0x11FF, 'Hangul'),
+    (0x3040, 0x309F, 'Hiragana'),
+    (0x30A0, 0x30FF, 'Katakana'),
+    (0x3400, 0x4DBF, 'Han'),
+    (0x4E00, 0x9FFF, 'Han'),
+    (0xAC00, 0xD7AF, 'Hangul'),
+]
+_RANGE_STARTS = [start for start, _, _ in _SCRIPT_RANGES]
+
+# Scripts used by exactly one of our languages
+_SCRIPT_LANGUAGES = {
+    'Gurmukhi': 'pa', 'Gujarati': 'gu', 'Oriya': 'or', 'Tamil': 'ta', 'Telugu': 'te',
+    'Kannada': 'kn', 'Malayalam': 'ml', 'Sinhala': 'si', 'Hangul': 'ko', 'Cyrillic': 'ru',
+    'Greek': 'el'
+}
+
+_DEVANAGARI_WORDS = {
+    'hi': {'है', 'हैं', 'और', 'के', 'में', 'की', 'का', 'से', 'को', 'था', 'थे', 'यह', 'नहीं', 'लिए', 'भी'},
+    'mr': {'आहे', 'आहेत', 'आणि', 'होते', 'केले', 'हा', 'ही', 'या', 'नाही', 'म्हणून', 'त्यांनी', 'आम्ही'},
+    'ne': {'छ', 'छन्', 'हो', 'र', 'पनि', 'थियो', 'हुन्छ', 'भएको', 'गर्न', 'यो', 'त्यो', 'मा', 'लागि'}
+}
+
+# Common function words; whole-word hits are the strongest signal for Latin-script languages
+_LATIN_WORDS = {
+    'en': 'the and is in to of that it with for as was on are this be by from have not',
+    'es': 'el la de que y en los las del se por un una es con para al lo como pero',
+    'fr': 'le la les de et des est un une que en du pour dans pas qui sur au avec ce',
+    'de': 'der die und das ist nicht den mit von zu ein eine ich sich auf für im dem auch',
+    'it': 'il di che la per un una sono non del della gli le con è nel anche alla',
+    'pt': 'o a de que do da em um uma para com não os as por é mais se',
+    'tr': 'bir ve bu da de için ile ne çok daha gibi olarak olan ama değil',
+    'nl': 'de het een van en is dat niet op te zijn voor met die wordt ook',
+    'sv': 'och att det som är en på för med av den inte till har jag var',
+    'da': 'og at det som er en på for med af den ikke til har jeg var blev efter meget mig dig hvad nu',
+    'no': 'og at det som er en på for med av den ikke til har jeg var ble etter mye meg deg hva nå',
+    'fi': 'ja on ei se että hän oli ovat mutta kun tai myös tämä niin'
+}
+_LATIN_WORDS = {lang: set(words.split()) for lang, words in _LATIN_WORDS.items()}
+
+# Character n-grams that are rare outside one or two of the languages
+_LATIN_NGRAMS = {
+    'en': ('th', 'wh', 'ing', 'ght'),
+    'es': ('ñ', 'ción', '¿', '¡', 'll'),
+    'fr': ('eau', 'oi', 'è', 'ê', 'ç', 'œ', "qu'", "l'"),
+    'de': ('sch', 'ß', 'ü', 'ei', 'ie', 'tz'),
+    'it': ('zione', 'gli', 'cch', 'zz'),
+    'pt': ('ção', 'ã', 'õ', 'nh', 'lh'),
+    'tr': ('ş', 'ğ', 'ı', 'ler', 'lar'),
+    'nl': ('ij', 'oe', 'aa', 'sch'),
+    'sv': ('å', 'ä', 'ö', 'tt'),
+    'da': ('ø', 'æ', 'å'),
+    'no': ('ø', 'æ', 'å'),
+    'fi': ('ää', 'yy', 'kk', 'ssa', 'ä')
+}
+
+_URDU_LETTERS = set('ٹڈڑںےہھگک')
+_ASSAMESE_LETTERS = set('ৰৱ')
+_WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def _script_of(char):
+    i = bisect.bisect_right(_RANGE_STARTS, ord(char)) - 1
+    if i >= 0 and ord(char) <= _SCRIPT_RANGES[i][1]:
+        return _SCRIPT_RANGES[i][2]
+    return None
+
+
+def _script_counts(text):
+    counts = {}
+    for char in text:
+        if char.isalpha():
+            script = _script_of(char)
+            if script:
+                counts[script] = counts.get(script, 0) + 1
+    return counts
+
+
+def _best(scores, min_score):
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if not ranked or ranked[0][1] < min_score:
+        return None, 0.0
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0
+    return ranked[0][0], (ranked[0][1] - runner_up) / ranked[0][1]
+
+
+def detect_language(text):
+    """Guess the language of `text`; returns (code, confidence) with code None if unsure.
+
+    Non-Latin scripts are decided by Unicode block (with marker words or
+    letters to separate Hindi/Marathi/Nepali, Bengali/Assamese and
+    Arabic/Urdu). Latin-script text is scored on function words and
+    distinctive character n-grams.
+    """
+    counts = _script_counts(text)
+    if not counts:
+        return None, 0.0
+    script, letters = max(counts.items(), key=lambda item: item[1])
+    confidence = letters / sum(counts.values())
+
+    if script in _SCRIPT_LANGUAGES:
+        return _SCRIPT_LANGUAGES[script], confidence
+    if script in ('Hiragana', 'Katakana'):
+        return 'ja', confidence
+    if script == 'Han':
+        # Kana anywhere means Japanese written with kanji
+        return ('ja' if counts.get('Hiragana') or counts.get('Katakana') else 'zh'), confidence
+    if script == 'Bengali':
+        return ('as' if _ASSAMESE_LETTERS.intersection(text) else 'bn'), confidence
+    if script == 'Arabic':
+        return ('ur' if _URDU_LETTERS.intersection(text) else 'ar'), confidence
+    if script == 'Devanagari':
+        words = set(text.split())
+        scores = {lang: len(words & markers) for lang, markers in _DEVANAGARI_WORDS.items()}
+        if 'ळ' in text:
+            scores['mr'] += 2
+        lang, _ = _best(scores, 1)
+        return lang or 'hi', confidence
+
+    lowered = text.lower()
+    words = _WORD_RE.findall(lowered)
+    scores = {}
+    for lang, stopwords in _LATIN_WORDS.items():
+        score = 2 * sum(1 for word in words if word in stopwords)
+        score += sum(1 for ngram in _LATIN_NGRAMS[lang] if ngram in lowered)
+        scores[lang] = score
+    lang, margin = _best(scores, 3)
+    return lang, confidence * margin
+
+
+def detect(text, min_confidence=0.2):
+    """Language code for `text`, or None when the evidence is too weak"""
+    lang, confidence = detect_language(text)
+    return lang if lang and confidence >= min_confidence else None
+
+
+def source_language(text, source_lang='auto'):
+    """The explicit source language, else the detected one, else 'auto' to let upstream guess"""
+    if source_lang != 'auto':
+        return source_lang
+    return detect(text) or 'auto'
+
+
+def language_runs(sentences, source_lang='auto'):
+    """Group consecutive sentences into (language, sentences) runs.
+
+    With an explicit source language everything is one run. Otherwise each
+    sentence is detected on its own; sentences that can't be told apart
+    (numbers, names, very short fragments) take the document's overall
+    language. Runs that still have no language are labelled 'auto'.
+    """
+    sentences = list(sentences)
+    if not sentences:
+        return []
+    if source_lang != 'auto':
+        return [(source_lang, sentences)]
+
+    document_lang = detect(' '.join(sentences)[:4000])
+    runs = []
+    for sentence in sentences:
+        lang = detect(sentence) or document_lang or 'auto'
+        if runs and runs[-1][0] == lang:
+            runs[-1][1].append(sentence)
+        else:
+            runs.append((lang, [sentence]))
+    return runs
@@ -0,0 +1,480 @@
+import contextvars
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+import metrics
+from single_flight import SingleFlight
+
+PUBLIC_INSTANCES = [
+    "https://lingva.ml/api/v1",
+    "https://translate.igodo.eu/api/v1",
+    "https://translate.plausibility.cloud/api/v1"
+]
+
+# LINGVA_INSTANCES (comma-separated API base URLs) points the apps at self-hosted or local instances
+DEFAULT_INSTANCES = [
+    url.strip().rstrip('/') for url in os.environ.get('LINGVA_INSTANCES', '').split(',') if url.strip()
+] or list(PUBLIC_INSTANCES)
+
+# Longest text sent in one request; longer input is segmented first (see segmentation.py)
+MAX_CHUNK_CHARS = 1000
+
+# Responses telling us to slow down rather than that the instance is broken
+THROTTLE_STATUSES = (429, 503)
+# Threads for hedged requests, shared by all callers of one pool
+HEDGE_WORKERS = 64
+
+
+class UpstreamThrottled(Exception):
+    """An instance answered 429/503; `retry_after` is its Retry-After in seconds, if it sent one"""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}" + (f", retry after {retry_after:.0f}s" if retry_after is not None else ""))
+        self.status = status
+        self.retry_after = retry_after
+
+
+def upstream_outcome(error):
+    return 'throttled' if isinstance(error, UpstreamThrottled) else 'error'
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Consume a token if one is available right now"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def _wait_time(self):
+        return (1 - self.tokens) / self.rate
+
+    def wait_time(self):
+        """Seconds until a token will be available"""
+        with self.lock:
+            self._refill()
+            return max(0.0, self._wait_time())
+
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = self._wait_time()
+            time.sleep(wait_time)
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """Token bucket whose rate follows upstream feedback (AIMD).
+
+    Every healthy response adds `increase` requests/s, up to `max_rate`. A
+    429/503 multiplies the rate by `decrease` and pauses the instance for its
+    Retry-After, or for a jittered exponential backoff when it sent none;
+    other server errors cut the rate by `error_decrease`. Cuts are applied at
+    most once per second, so a burst of concurrent failures counts as one.
+    """
+
+    def __init__(self, rate, max_rate=None, min_rate=0.1, increase=0.1, decrease=0.5, error_decrease=0.8,
+                 backoff_base=1.0, max_backoff=60.0):
+        super().__init__(rate)
+        self.max_rate = max(self.rate, float(max_rate) if max_rate is not None else 4 * self.rate)
+        self.min_rate = min(self.rate, min_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.error_decrease = error_decrease
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.backoff_streak = 0
+        self.throttled = 0
+        self.cut_at = 0.0
+
+    def _set_rate(self, rate):
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+        self.capacity = max(1.0, self.rate)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self):
+        # While paused, `updated` is the time the pause ends
+        if time.monotonic() >= self.updated:
+            super()._refill()
+
+    def _wait_time(self):
+        return max(0.0, self.updated - time.monotonic()) + (1 - self.tokens) / self.rate
+
+    def _cut(self, factor, now):
+        if now - self.cut_at < 1.0:
+            return False
+        self.cut_at = now
+        self._set_rate(self.rate * factor)
+        return True
+
+    def on_success(self):
+        with self.lock:
+            self.backoff_streak = 0
+            self._set_rate(self.rate + self.increase)
+
+    def on_throttle(self, retry_after=None):
+        """Slow down after a 429/503 and return the pause in seconds"""
+        with self.lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if self._cut(self.decrease, now):
+                self.backoff_streak += 1
+            if retry_after is not None:
+                # Spread clients released by the same Retry-After a little
+                delay = min(self.max_backoff, retry_after) * random.uniform(1.0, 1.2)
+            else:
+                delay = min(self.max_backoff, self.backoff_base * 2 ** max(0, self.backoff_streak - 1))
+                delay = random.uniform(delay / 2, delay)
+            self._refill()
+            if now + delay > self.updated:
+                self.tokens = min(self.tokens, 0.0)
+                self.updated = now + delay
+            return delay
+
+    def on_error(self):
+        with self.lock:
+            self._cut(self.error_decrease, time.monotonic())
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'rate_qps': round(self.rate, 2),
+                'max_rate_qps': round(self.max_rate, 2),
+                'paused_for': round(max(0.0, self.updated - time.monotonic()), 1),
+                'throttled': self.throttled
+            }
+
+
+class InstanceHealth:
+    """Latency and error tracking plus circuit breaker state for one endpoint"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, url, instance_qps, alpha=0.3, max_instance_qps=None):
+        self.url = url
+        self.alpha = alpha
+        self.bucket = AdaptiveRateLimiter(instance_qps, max_rate=max_instance_qps)
+        self.latency_ewma = None
+        self.error_rate = 0.0
+        self.samples = deque(maxlen=50)
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.requests = 0
+        self.failures = 0
+        self.throttled_at = 0.0
+        self.updated = time.monotonic()
+
+    def decayed_error_rate(self, now):
+        # Errors fade with a one-minute half-life so an idle instance gets another chance
+        return self.error_rate * 0.5 ** ((now - self.updated) / 60.0)
+
+    def score(self, failure_cost, now=None):
+        """Expected cost of a request in seconds; lower is better and untried instances go first"""
+        now = time.monotonic() if now is None else now
+        latency = self.latency_ewma if self.latency_ewma is not None else 0.0
+        return latency + self.decayed_error_rate(now) * failure_cost
+
+    def p95(self):
+        if len(self.samples) < 5:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def snapshot(self):
+        return {
+            'url': self.url,
+            'state': self.state,
+            'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            'latency_p95': round(self.p95(), 3) if self.p95() is not None else None,
+            'error_rate': round(self.decayed_error_rate(time.monotonic()), 3),
+            'requests': self.requests,
+            'failures': self.failures,
+            **self.bucket.snapshot()
+        }
+
+
+class InstancePool:
+    """Routes translation requests to the fastest healthy Lingva instance.
+
+    Each instance has a latency EWMA, an error-rate EWMA and a circuit breaker
+    that opens after `failure_threshold` consecutive failures and lets a single
+    probe through after `reset_timeout` seconds. With `hedge=True`, a request
+    still running after the instance's p95 latency is duplicated to the next
+    best instance and whichever answers first wins. The delay is counted from
+    when the request is actually sent, so waiting for a hedge thread never
+    looks like a slow instance.
+
+    Request rates start at `instance_qps` and adapt per instance (see
+    AdaptiveRateLimiter) between a floor and `max_instance_qps`, by default
+    four times the starting rate. Throttled instances are paused rather than
+    counted towards their circuit breaker.
+    """
+
+    def __init__(self, instances=None, instance_qps=2.0, failure_threshold=3, reset_timeout=30,
+                 hedge=False, hedge_min_delay=0.5, timeout=15, session=None, max_instance_qps=None, throttle_retries=2):
+        self.instances = [
+            InstanceHealth(url, instance_qps, max_instance_qps=max_instance_qps) for url in (instances or DEFAULT_INSTANCES)
+        ]
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.timeout = timeout
+        self.throttle_retries = throttle_retries
+        self._session = session
+        self.lock = threading.Lock()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge") if hedge else None
+        self.single_flight = SingleFlight()
+
+    @property
+    def session(self):
+        """The requests session used by translate(), created on first use.
+
+        Pools that only do the routing bookkeeping for another client (the
+        aiohttp server) never open one.
+        """
+        if self._session is None:
+            with self.lock:
+                if self._session is None:
+                    self._session = requests.Session()
+        return self._session
+
+    def _is_available(self, health, now):
+        if health.state == InstanceHealth.CLOSED:
+            return True
+        if health.state == InstanceHealth.OPEN and now - health.opened_at >= self.reset_timeout:
+            health.state = InstanceHealth.HALF_OPEN
+            health.probe_in_flight = False
+        return health.state == InstanceHealth.HALF_OPEN and not health.probe_in_flight
+
+    def select(self, exclude, block=True):
+        """Pick the best available instance not in `exclude`, preferring ones with spare rate budget"""
+        with self.lock:
+            now = time.monotonic()
+            ranked = sorted(
+                (i for i, h in enumerate(self.instances) if i not in exclude and self._is_available(h, now)),
+                key=lambda i: self.instances[i].score(self.timeout, now)
+            )
+            if not ranked:
+                return None
+            chosen = next((i for i in ranked if self.instances[i].bucket.try_acquire()), None)
+            has_token = chosen is not None
+            if not has_token:
+                if not block:
+                    return None
+                chosen = min(ranked, key=lambda i: self.instances[i].bucket.wait_time())
+            if self.instances[chosen].state == InstanceHealth.HALF_OPEN:
+                self.instances[chosen].probe_in_flight = True
+        if not has_token:
+            # Every candidate is at its rate limit or paused; wait for the one that frees up first
+            self.instances[chosen].bucket.acquire()
+        return chosen
+
+    def record(self, idx, latency=None, error=None, status=None):
+        """Feed a request's outcome to the instance's health, circuit breaker and rate limiter.
+
+        `status` is the HTTP status of a failed request, if it got one.
+        """
+        health = self.instances[idx]
+        if error is None:
+            health.bucket.on_success()
+        elif isinstance(error, UpstreamThrottled):
+            delay = health.bucket.on_throttle(error.retry_after)
+            logging.warning(f"{health.url} throttled ({error}); pausing {delay:.1f}s at {health.bucket.rate:.2f} req/s")
+        elif status is not None and status >= 500:
+            health.bucket.on_error()
+        with self.lock:
+            now = time.monotonic()
+            health.requests += 1
+            failed = error is not None
+            error_rate = health.decayed_error_rate(now)
+            health.error_rate = (1 - health.alpha) * error_rate + health.alpha * (1.0 if failed else 0.0)
+            health.updated = now
+            if isinstance(error, UpstreamThrottled):
+                # The limiter handles throttling; it doesn't mean the instance is down
+                health.failures += 1
+                health.throttled_at = now
+            elif failed:
+                health.failures += 1
+                health.consecutive_failures += 1
+                if health.state == InstanceHealth.HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                    if health.state != InstanceHealth.OPEN:
+                        logging.warning(f"Opening circuit for {health.url}: {error}")
+                    health.state = InstanceHealth.OPEN
+                    health.opened_at = now
+            else:
+                health.samples.append(latency)
+                if health.latency_ewma is None:
+                    health.latency_ewma = latency
+                else:
+                    health.latency_ewma = (1 - health.alpha) * health.latency_ewma + health.alpha * latency
+                health.consecutive_failures = 0
+                health.state = InstanceHealth.CLOSED
+            health.probe_in_flight = False
+
+    def release(self, idx):
+        """Forget an abandoned request without counting it as a success or failure"""
+        with self.lock:
+            self.instances[idx].probe_in_flight = False
+
+    def has_available(self, exclude=()):
+        """Whether any instance outside `exclude` can take a request (ignoring rate limits)"""
+        with self.lock:
+            now = time.monotonic()
+            return any(i not in exclude and self._is_available(h, now) for i, h in enumerate(self.instances))
+
+    def throttled_since(self, indices, since):
+        """Those of `indices` that were throttled after `since` (monotonic); worth retrying once their pause ends"""
+        with self.lock:
+            return {i for i in indices if self.instances[i].throttled_at > since}
+
+    def url_for(self, idx, text, source_lang, target_lang):
+        encoded_text = urllib.parse.quote(text.strip())
+        return f"{self.instances[idx].url}/{source_lang}/{target_lang}/{encoded_text}"
+
+    def _send(self, idx, text, source_lang, target_lang):
+        url = self.url_for(idx, text, source_lang, target_lang)
+        start = time.perf_counter()
+        status = None
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            status = response.status_code
+            if status in THROTTLE_STATUSES:
+                raise UpstreamThrottled(status, parse_retry_after(response.headers.get('Retry-After')))
+            response.raise_for_status()
+            translation = response.json().get('translation', '').strip()
+            if not translation:
+                raise ValueError("empty translation")
+        except Exception as e:
+            self.record(idx, error=e, status=status)
+            metrics.inc('upstream_requests_total', instance=self.instances[idx].url, outcome=upstream_outcome(e))
+            metrics.trace_count('upstream_errors')
+            raise
+        latency = time.perf_counter() - start
+        self.record(idx, latency=latency)
+        metrics.inc('upstream_requests_total', instance=self.instances[idx].url, outcome='ok')
+        metrics.observe('upstream_latency_seconds', latency, instance=self.instances[idx].url)
+        metrics.trace_count('upstream_calls')
+        return translation
+
+    def hedge_delay(self, idx):
+        health = self.instances[idx]
+        p95 = health.p95()
+        if p95 is None:
+            p95 = 2 * health.latency_ewma if health.latency_ewma is not None else 1.0
+        return max(self.hedge_min_delay, p95)
+
+    def translate(self, text, source_lang='auto', target_lang='en'):
+        """Translate one chunk, failing over between instances. Returns None if every instance fails.
+
+        Identical chunks requested concurrently (e.g. several sessions opening
+        the same article) share a single upstream call.
+        """
+        return self.single_flight.do(
+            (source_lang, target_lang, text.strip()),
+            lambda: self._translate(text, source_lang, target_lang)
+        )
+
+    def _translate(self, text, source_lang, target_lang):
+        tried = set()
+        started = time.monotonic()
+        retries = 0
+        while True:
+            idx = self.select(tried)
+            if idx is None:
+                # Everything failed; instances that only throttled us get another go after their pause
+                throttled = self.throttled_since(tried, started)
+                if not throttled or retries >= self.throttle_retries:
+                    return None
+                retries += 1
+                tried -= throttled
+                continue
+            if tried:
+                metrics.inc('failovers_total')
+                metrics.trace_count('failovers')
+            tried.add(idx)
+
+            if not self.hedge:
+                try:
+                    return self._send(idx, text, source_lang, target_lang)
+                except Exception as e:
+                    logging.warning(f"Instance {self.instances[idx].url} failed: {e}")
+                    continue
+
+            sending = threading.Event()
+
+            def send_primary(idx=idx):
+                sending.set()
+                return self._send(idx, text, source_lang, target_lang)
+
+            futures = [self._hedge_executor.submit(contextvars.copy_context().run, send_primary)]
+            sending.wait()
+            done, pending = wait(futures, timeout=self.hedge_delay(idx))
+            if not done:
+                backup = self.select(tried, block=False)
+                if backup is not None:
+                    tried.add(backup)
+                    logging.info(f"Hedging slow request to {self.instances[backup].url}")
+                    metrics.inc('hedged_requests_total')
+                    futures.append(self._hedge_executor.submit(
+                        contextvars.copy_context().run, self._send, backup, text, source_lang, target_lang
+                    ))
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+
+    def snapshot(self):
+        """Current health of every instance, best first"""
+        with self.lock:
+            ordered = sorted(self.instances, key=lambda h: h.score(self.timeout))
+            return [health.snapshot() for health in ordered]
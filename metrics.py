@@ -0,0 +1,245 @@
+"""In-process counters and histograms for the translation hot paths.
+
+Metrics are kept per label set and can be rendered in the Prometheus text
+format (Flask /metrics) or as a plain dict (Streamlit diagnostics panel).
+Set TRANSLATION_METRICS=0 to turn every call here into an early return.
+
+With TRANSLATION_TRACE=1 each request can also carry a trace ID; upstream
+calls, chunks and cache hits made on its behalf (including from worker
+threads started through ChunkExecutor) are tallied on the trace.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+import uuid
+
+ENABLED = os.environ.get('TRANSLATION_METRICS', '1') != '0'
+TRACING = os.environ.get('TRANSLATION_TRACE', '0') == '1'
+PREFIX = 'wikitranslate_'
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (50, 100, 200, 400, 700, 1000, 2000, 5000)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+HISTOGRAMS = {
+    'upstream_latency_seconds': ("Latency of successful Lingva requests", LATENCY_BUCKETS),
+    'translate_seconds': ("Time to translate one text, by path", LATENCY_BUCKETS),
+    'chunk_chars': ("Characters per chunk sent upstream", SIZE_BUCKETS),
+    'chunks_per_text': ("Chunks sent upstream per long text", COUNT_BUCKETS),
+    'wikipedia_fetch_seconds': ("Time to fetch article outlines, cache hits included", LATENCY_BUCKETS),
+    'wikipedia_request_seconds': ("Latency of MediaWiki API requests", LATENCY_BUCKETS),
+    'ocr_seconds': ("Time to OCR one image, cache hits included", LATENCY_BUCKETS),
+    'ocr_tiles': ("Tiles per OCR'd image", COUNT_BUCKETS),
+    'job_wait_seconds': ("Time jobs spent queued before a worker took them, by lane", LATENCY_BUCKETS)
+}
+COUNTERS = {
+    'upstream_requests_total': "Lingva requests by instance and outcome",
+    'failovers_total': "Chunks retried on another instance after a failure",
+    'hedged_requests_total': "Backup requests sent because the first one was slow",
+    'ocr_cache_total': "OCR cache lookups by result",
+    'jobs_total': "Finished jobs by lane and status"
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_trace = contextvars.ContextVar('translation_trace', default=None)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Add a value to a histogram"""
+    if not ENABLED:
+        return
+    buckets = HISTOGRAMS[name][1]
+    key = _key(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {}).get(key)
+        if series is None:
+            series = _histograms[name][key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+        series['buckets'][bisect.bisect_left(buckets, value)] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+
+def inc(name, amount=1, **labels):
+    """Increment a counter"""
+    if not ENABLED:
+        return
+    key = _key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + amount
+
+
+def timer(name, **labels):
+    """Context manager observing the elapsed seconds into a histogram"""
+    return _Timer(name, labels) if ENABLED else _NULL_TIMER
+
+
+def timed(name, **labels):
+    """Decorator timing each call into a histogram.
+
+    Generator functions are timed until exhausted or closed, coroutine
+    functions until they return.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with _Timer(name, labels):
+                    return await fn(*args, **kwargs)
+        elif inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with _Timer(name, labels):
+                    yield from fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with _Timer(name, labels):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_chunks(chunks):
+    """Record how many chunks a long text was split into for upstream, and their sizes"""
+    if not ENABLED or not chunks:
+        return
+    observe('chunks_per_text', len(chunks))
+    for chunk in chunks:
+        observe('chunk_chars', len(chunk))
+    trace_count('chunks', len(chunks))
+
+
+def _quantile(buckets, counts, total, q):
+    rank = q * total
+    seen = 0
+    for bound, count in zip(buckets, counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return float('inf')
+
+
+def snapshot():
+    """Plain-dict view of every series, with bucket-estimated p50/p95 for histograms"""
+    with _lock:
+        histograms = {
+            name: [
+                dict(labels, count=s['count'], sum=s['sum'],
+                     p50=_quantile(HISTOGRAMS[name][1], s['buckets'], s['count'], 0.5),
+                     p95=_quantile(HISTOGRAMS[name][1], s['buckets'], s['count'], 0.95))
+                for labels, s in ((dict(key), s) for key, s in series.items())
+            ]
+            for name, series in _histograms.items()
+        }
+        counters = {name: [dict(dict(key), value=value) for key, value in series.items()] for name, series in _counters.items()}
+    return {'histograms': histograms, 'counters': counters}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def render_prometheus(gauges=None):
+    """Prometheus text exposition of all metrics; `gauges` maps name -> (help, value) for extra point-in-time values"""
+    lines = []
+    with _lock:
+        for name, series in sorted(_counters.items()):
+            lines.append(f"# HELP {PREFIX}{name} {COUNTERS[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+        for name, series in sorted(_histograms.items()):
+            help_text, buckets = HISTOGRAMS[name]
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for key, s in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], s['buckets']):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {s['sum']}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {s['count']}")
+    for name, (help_text, value) in sorted((gauges or {}).items()):
+        lines.append(f"# HELP {PREFIX}{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}{name} gauge")
+        lines.append(f"{PREFIX}{name} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def start_trace(trace_id=None):
+    """Begin a trace for the current request/context and return its ID, or None when tracing is off"""
+    if not TRACING:
+        return None
+    trace = {'id': trace_id or uuid.uuid4().hex[:16], 'start': time.perf_counter(), 'counts': {}}
+    _trace.set(trace)
+    return trace['id']
+
+
+def trace_count(name, amount=1):
+    """Tally an event on the current trace, if any"""
+    trace = _trace.get()
+    if trace is not None:
+        with _lock:
+            trace['counts'][name] = trace['counts'].get(name, 0) + amount
+
+
+def end_trace():
+    """Finish the current trace and return a summary dict, or None"""
+    trace = _trace.get()
+    if trace is None:
+        return None
+    _trace.set(None)
+    with _lock:
+        counts = dict(trace['counts'])
+    return dict(counts, trace_id=trace['id'], seconds=round(time.perf_counter() - trace['start'], 4))
@@ -0,0 +1,169 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pytesseract
+from PIL import Image, ImageOps
+
+import metrics
+
+# App language code -> tesseract traineddata name
+TESSERACT_LANGUAGES = {
+    'en': 'eng', 'hi': 'hin', 'te': 'tel', 'ta': 'tam', 'kn': 'kan', 'ml': 'mal',
+    'mr': 'mar', 'bn': 'ben', 'gu': 'guj', 'pa': 'pan', 'or': 'ori', 'as': 'asm',
+    'ur': 'urd', 'ne': 'nep', 'si': 'sin', 'es': 'spa', 'fr': 'fra', 'de': 'deu',
+    'it': 'ita', 'pt': 'por', 'ru': 'rus', 'ja': 'jpn', 'ko': 'kor', 'zh': 'chi_sim',
+    'ar': 'ara', 'tr': 'tur', 'nl': 'nld', 'sv': 'swe', 'da': 'dan', 'no': 'nor', 'fi': 'fin'
+}
+
+DEFAULT_CONFIG = r'--oem 3 --psm 6'
+
+
+def _otsu_threshold(histogram):
+    """Threshold that best separates a 256-bin grayscale histogram into ink and paper"""
+    total = sum(histogram)
+    weighted_total = sum(i * count for i, count in enumerate(histogram))
+    background = weighted = 0
+    best, threshold = 0.0, 127
+    for i, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted += i * count
+        mean_background = weighted / background
+        mean_foreground = (weighted_total - weighted) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best:
+            best, threshold = variance, i
+    return threshold
+
+
+def preprocess(image, target_dpi=300, max_side=3000):
+    """Grayscale, downscale to roughly `target_dpi` (and at most `max_side` px) and binarize"""
+    image = ImageOps.exif_transpose(image)
+    gray = ImageOps.grayscale(image)
+
+    scale = 1.0
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0] and dpi[0] > target_dpi:
+        scale = target_dpi / float(dpi[0])
+    longest = max(gray.size) * scale
+    if longest > max_side:
+        scale *= max_side / longest
+    if scale < 1.0:
+        gray = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))), Image.LANCZOS)
+
+    gray = ImageOps.autocontrast(gray)
+    threshold = _otsu_threshold(gray.histogram())
+    return gray.point(lambda p: 255 if p > threshold else 0, mode='1').convert('L')
+
+
+def _blank_row(image, y):
+    low, _ = image.crop((0, y, image.width, y + 1)).getextrema()
+    return low == 255
+
+
+def split_tiles(image, tile_height=1200, search=150):
+    """Cut a tall page into horizontal bands, cutting on blank rows so text lines aren't split"""
+    tiles = []
+    top = 0
+    while image.height - top > tile_height * 1.5:
+        cut = top + tile_height
+        for offset in range(0, search, 2):
+            if _blank_row(image, cut + offset):
+                cut += offset
+                break
+            if _blank_row(image, cut - offset):
+                cut -= offset
+                break
+        tiles.append(image.crop((0, top, image.width, cut)))
+        top = cut
+    tiles.append(image.crop((0, top, image.width, image.height)))
+    return tiles
+
+
+def _ocr_png(png_bytes, lang, config):
+    # Runs in a worker process, so it takes bytes rather than a PIL image
+    return pytesseract.image_to_string(Image.open(io.BytesIO(png_bytes)), lang=lang, config=config)
+
+
+class OcrPipeline:
+    """Preprocess, tile and OCR images in parallel, caching results by image content"""
+
+    def __init__(self, max_workers=None, cache_size=128, tile_height=1200, target_dpi=300, config=DEFAULT_CONFIG):
+        self.max_workers = max_workers or max(1, min(4, os.cpu_count() or 1))
+        self.tile_height = tile_height
+        self.target_dpi = target_dpi
+        self.config = config
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._installed = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn keeps worker processes from inheriting the app's threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def installed_languages(self):
+        if self._installed is None:
+            try:
+                self._installed = set(pytesseract.get_languages(config=''))
+            except Exception:
+                self._installed = {'eng'}
+        return self._installed
+
+    def tesseract_lang(self, source_lang):
+        """Language packs for the selected source; English is added for mixed-script pages"""
+        wanted = [TESSERACT_LANGUAGES.get(source_lang, 'eng'), 'eng']
+        installed = self.installed_languages()
+        langs = [lang for lang in dict.fromkeys(wanted) if lang in installed]
+        return '+'.join(langs) or 'eng'
+
+    def extract_text(self, image_bytes, source_lang='auto'):
+        """OCR raw image bytes, reusing the result if the same image was seen before"""
+        with metrics.timer('ocr_seconds'):
+            return self._extract_text(image_bytes, source_lang)
+
+    def _extract_text(self, image_bytes, source_lang):
+        lang = self.tesseract_lang(source_lang)
+        key = hashlib.sha256(image_bytes).hexdigest() + ':' + lang
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                metrics.inc('ocr_cache_total', result='hit')
+                return self._cache[key]
+        metrics.inc('ocr_cache_total', result='miss')
+
+        image = preprocess(Image.open(io.BytesIO(image_bytes)), self.target_dpi)
+        tiles = split_tiles(image, self.tile_height)
+        metrics.observe('ocr_tiles', len(tiles))
+        if len(tiles) == 1:
+            texts = [pytesseract.image_to_string(tiles[0], lang=lang, config=self.config)]
+        else:
+            payloads = []
+            for tile in tiles:
+                buffer = io.BytesIO()
+                tile.save(buffer, format='PNG')
+                payloads.append(buffer.getvalue())
+            texts = list(self._pool().map(_ocr_png, payloads, [lang] * len(payloads), [self.config] * len(payloads)))
+
+        text = '\n'.join(t.strip() for t in texts if t.strip())
+        with self._lock:
+            self._cache[key] = text
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
@@ -0,0 +1,211 @@
+"""Warm the translation memory with popular Wikipedia articles ahead of requests.
+
+Fetches each title through the same Wikipedia cache the apps use and
+translates its intro (and the first few sections) into every target
+language, storing sentences in the shared translation memory. A small
+state table remembers which revision was warmed for each target, so
+unchanged articles cost one batched revision check per run and edited
+articles only send their new or changed sentences upstream.
+
+    python prefetch.py "India" "Taj Mahal" --targets hi,ta,te
+    python prefetch.py --titles-file popular.txt --mock --interval 3600
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+
+from api_common import INDIC_LANGUAGE_CODES, MOCK_ARTICLES, search_article_mock
+from chunk_executor import ChunkExecutor
+from language_id import source_language
+from lingva_pool import DEFAULT_INSTANCES, MAX_CHUNK_CHARS, InstancePool
+from segmentation import segment_lines
+from translation_memory import TranslationMemory, TranslationReport, iter_translate_detected
+from wikipedia_client import WikipediaClient
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+# Chunk sizes the Streamlit Wikipedia tab and the Flask mock search translate with,
+# so long texts are segmented into the same sentences (and memory keys) as at request time
+WIKIPEDIA_CHUNK_SIZE = 700
+MOCK_CHUNK_SIZE = 800
+
+
+class Prefetcher:
+    """Translate articles into the translation memory at a deliberately low request rate"""
+
+    def __init__(self, targets, sections=3, instance_qps=0.5, max_age=7 * 24 * 3600, memory=None, wikipedia=None):
+        self.targets = list(targets)
+        self.sections = sections
+        self.max_age = max_age
+        # Rates may still drop on throttling, but never rise above instance_qps
+        self.pool = InstancePool(list(DEFAULT_INSTANCES), instance_qps=instance_qps, hedge=False, max_instance_qps=instance_qps)
+        self.chunk_executor = ChunkExecutor(1)
+        self.memory = memory or TranslationMemory()
+        self.wikipedia = wikipedia or WikipediaClient()
+        self.upstream_calls = 0
+        self._state = None
+        if self.memory.db_path:
+            self._state = sqlite3.connect(self.memory.db_path, timeout=5, isolation_level=None)
+            self._state.execute(
+                "CREATE TABLE IF NOT EXISTS prefetch_state ("
+                " title TEXT NOT NULL, target TEXT NOT NULL, revision INTEGER,"
+                " warmed REAL NOT NULL, PRIMARY KEY (title, target))"
+            )
+
+    def _is_warm(self, title, target, revision):
+        if self._state is None:
+            return False
+        row = self._state.execute(
+            "SELECT revision, warmed FROM prefetch_state WHERE title=? AND target=?", (title, target)
+        ).fetchone()
+        # Re-warm well before memory entries reach their disk TTL
+        return bool(row) and row[0] == revision and time.time() - row[1] < self.max_age
+
+    def _mark_warm(self, title, target, revision):
+        if self._state is not None:
+            self._state.execute(
+                "INSERT OR REPLACE INTO prefetch_state VALUES (?, ?, ?, ?)", (title, target, revision, time.time())
+            )
+
+    def _translate(self, text, source_lang, target_lang):
+        self.upstream_calls += 1
+        return self.pool.translate(text, source_lang, target_lang)
+
+    def warm(self, text, source_lang, target_lang, chunk_size):
+        """Put the translation of text into memory exactly as the apps would look it up.
+
+        Returns True when every sentence is now in memory (or needs no translation).
+        """
+        if not text or not text.strip():
+            return True
+        if len(text) <= chunk_size and len(text) <= MAX_CHUNK_CHARS:
+            source_lang = source_language(text, source_lang)
+            if source_lang == target_lang or self.memory.get(text, source_lang, target_lang) is not None:
+                return True
+            translation = self._translate(text, source_lang, target_lang)
+            if not translation:
+                return False
+            self.memory.put(text, source_lang, target_lang, translation)
+            return True
+
+        def translate_chunks(chunks, source_lang):
+            translated = self.chunk_executor.imap(lambda chunk: self._translate(chunk, source_lang, target_lang), chunks)
+            try:
+                for _, translation, _ in translated:
+                    yield translation
+            finally:
+                translated.close()
+
+        report = TranslationReport()
+        for _ in iter_translate_detected(
+            self.memory, segment_lines(text, chunk_size)[0], source_lang, target_lang, chunk_size, translate_chunks, report
+        ):
+            pass
+        return not report.failed and not report.uncached
+
+    def prefetch_articles(self, titles):
+        """Warm intro and leading sections of each article for every target; returns the number warmed"""
+        warmed = 0
+        try:
+            outlines = self.wikipedia.get_outlines(titles)
+        except Exception as e:
+            logging.error(f"Fetching article outlines failed: {e}")
+            return warmed
+        for title, outline in outlines.items():
+            if outline is None:
+                logging.warning(f"Skipping '{title}': article not found")
+                continue
+            sections = outline['sections'] if self.sections < 0 else outline['sections'][:self.sections]
+            for target in self.targets:
+                if self._is_warm(outline['title'], target, outline['revision']):
+                    continue
+                calls = self.upstream_calls
+                try:
+                    # Wikipedia content is in English, as in the Streamlit Wikipedia tab
+                    complete = self.warm(outline['intro'], 'en', target, WIKIPEDIA_CHUNK_SIZE)
+                    for section in sections:
+                        text = self.wikipedia.get_section(outline['title'], section['index'], outline['revision'])
+                        complete = self.warm(text, 'en', target, WIKIPEDIA_CHUNK_SIZE) and complete
+                except Exception as e:
+                    logging.error(f"Prefetch of '{outline['title']}' into {target} failed: {e}")
+                    continue
+                if not complete:
+                    # Left unmarked so the next pass retries the sentences that are still missing
+                    logging.warning(f"Prefetch of '{outline['title']}' into {target} is incomplete")
+                    continue
+                self._mark_warm(outline['title'], target, outline['revision'])
+                warmed += 1
+                logging.info(
+                    f"Warmed '{outline['title']}' (rev {outline['revision']}) into {target}: "
+                    f"{self.upstream_calls - calls} upstream calls"
+                )
+        return warmed
+
+    def prefetch_mock_topics(self):
+        """Warm the canned articles served by the Flask /search-and-translate endpoint"""
+        for topic in MOCK_ARTICLES:
+            content = search_article_mock(topic)['content']
+            for target in self.targets:
+                self.warm(content, 'auto', target, MOCK_CHUNK_SIZE)
+
+    def run(self, titles, mock=False):
+        start = time.perf_counter()
+        calls = self.upstream_calls
+        warmed = self.prefetch_articles(titles) if titles else 0
+        if mock:
+            self.prefetch_mock_topics()
+        logging.info(
+            f"Prefetch pass done in {time.perf_counter() - start:.1f}s: {warmed} article/target pairs refreshed, "
+            f"{self.upstream_calls - calls} upstream calls, memory {self.memory.stats()}"
+        )
+
+
+def read_titles(args):
+    titles = list(args.titles)
+    if args.titles_file:
+        with open(args.titles_file, encoding='utf-8') as f:
+            titles.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return list(dict.fromkeys(titles))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-translate popular Wikipedia articles into the translation memory")
+    parser.add_argument('titles', nargs='*', help="Article titles to prefetch")
+    parser.add_argument('--titles-file', help="File with one title per line ('#' starts a comment)")
+    parser.add_argument('--targets', default=','.join(INDIC_LANGUAGE_CODES),
+                        help="Comma-separated target languages (default: the Indic languages)")
+    parser.add_argument('--sections', type=int, default=3,
+                        help="Sections per article to translate besides the intro (-1 for all)")
+    parser.add_argument('--mock', action='store_true', help="Also warm the mock search topics")
+    parser.add_argument('--qps', type=float, default=float(os.environ.get('PREFETCH_INSTANCE_QPS', 0.5)),
+                        help="Requests per second per Lingva instance (keep low to leave room for users)")
+    parser.add_argument('--interval', type=float, default=0,
+                        help="Repeat every N seconds, picking up revised articles (default: run once)")
+    args = parser.parse_args()
+
+    titles = read_titles(args)
+    if not titles and not args.mock:
+        parser.error("give at least one title, --titles-file or --mock")
+
+    if hasattr(os, 'nice'):
+        os.nice(10)
+
+    prefetcher = Prefetcher(
+        [t.strip() for t in args.targets.split(',') if t.strip()],
+        sections=args.sections,
+        instance_qps=args.qps
+    )
+    try:
+        while True:
+            prefetcher.run(titles, mock=args.mock)
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+    finally:
+        prefetcher.chunk_executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
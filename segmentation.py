@@ -0,0 +1,157 @@
+import re
+
+from lingva_pool import MAX_CHUNK_CHARS
+
+# Latin/Arabic terminators only count before whitespace; danda and CJK stops
+# end a sentence even when the next one follows without a space. The leading
+# lookahead lets the scanner skip ahead to candidate characters.
+_BOUNDARY_RE = re.compile(
+    r"""(?=[.!?؟…।॥。！？\n])(?:
+        [.!?؟…]+["'”’»)\]]*(?=\s)
+      | [।॥。！？]+["'”’»)\]）」』]*
+      | \n[ \t]*\n
+    )\s*""",
+    re.VERBOSE
+)
+_LAST_WORD_RE = re.compile(r"(\w+)$")
+_LINE_BREAK_RE = re.compile(r"[ \t]*(\n\s*)")
+_CLAUSE_MARKS = ',;:،、，；：'
+
+ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'mt', 'vs', 'etc', 'no', 'nos', 'vol',
+    'fig', 'approx', 'inc', 'ltd', 'co', 'corp', 'dept', 'est', 'gen', 'gov', 'col', 'capt',
+    'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+    'ca', 'cf', 'al', 'pp', 'ed', 'eds', 'rev', 'op', 'ft', 'sq'
+}
+
+
+def _ends_sentence(text, match):
+    """Whether a '.' boundary is a real sentence end rather than an abbreviation or initial"""
+    following = text[match.end():match.end() + 1]
+    if following.islower():
+        return False
+    word = _LAST_WORD_RE.search(text, max(0, match.start() - 20), match.start())
+    if word is None:
+        return True
+    word = word.group(1)
+    return not (word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isalpha()))
+
+
+def split_sentences(text):
+    """Split text into sentences in a single pass over the string.
+
+    Understands Latin and Arabic terminators, the danda (।, ॥), CJK full
+    stops and paragraph breaks, and doesn't split after common
+    abbreviations, initials or before a lowercase continuation.
+    """
+    sentences = []
+    start = 0
+    for match in _BOUNDARY_RE.finditer(text):
+        if match.group().startswith('.') and not _ends_sentence(text, match):
+            continue
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def split_long(sentence, max_chars=MAX_CHUNK_CHARS):
+    """Break a sentence longer than max_chars at clause punctuation, else at a space, else anywhere"""
+    pieces = []
+    while len(sentence) > max_chars:
+        window = sentence[:max_chars]
+        cut = max(window.rfind(mark) for mark in _CLAUSE_MARKS) + 1
+        if cut < max_chars // 2:
+            cut = window.rfind(' ') + 1
+        if cut <= 0:
+            cut = max_chars
+        piece = sentence[:cut].strip()
+        if piece:
+            pieces.append(piece)
+        sentence = sentence[cut:].lstrip()
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def segment(text, max_chars=MAX_CHUNK_CHARS):
+    """Sentences of text, with any sentence over max_chars broken up so nothing gets truncated upstream"""
+    segments = []
+    for sentence in split_sentences(text):
+        if len(sentence) > max_chars:
+            segments.extend(split_long(sentence, max_chars))
+        else:
+            segments.append(sentence)
+    return segments
+
+
+def _break(newlines):
+    if not newlines:
+        return ''
+    return '\n\n' if newlines.count('\n') > 1 else '\n'
+
+
+def segment_lines(text, max_chars=MAX_CHUNK_CHARS):
+    """Segment text line by line, remembering how it was laid out.
+
+    Returns (segments, separators): separators[i] is what followed segment i
+    in the text, ' ' within a line, '\n' at a line break, '\n\n' at a
+    paragraph break and '' after the last one, so join_segments can put a
+    translation back into the same lines and paragraphs.
+    """
+    parts = _LINE_BREAK_RE.split(text)
+    segments = []
+    separators = []
+    for line, newlines in zip(parts[0::2], parts[1::2] + ['']):
+        pieces = segment(line, max_chars)
+        if pieces:
+            segments.extend(pieces)
+            separators.extend([' '] * (len(pieces) - 1) + [_break(newlines)])
+    if separators:
+        separators[-1] = ''
+    return segments, separators
+
+
+def join_segments(pieces, separators):
+    """Turn lists of translated segments (in order) into fragments that concatenate to the whole text.
+
+    Each fragment carries the separator before it, taken from the source
+    layout. Empty entries (sentences merged into an earlier line upstream)
+    pass their separator on to the translation they were merged into.
+    """
+    index = 0
+    pending = None
+    for piece in pieces:
+        fragment = []
+        for translated in piece:
+            if translated:
+                if pending is not None:
+                    fragment.append(pending)
+                fragment.append(translated)
+                pending = separators[index]
+            elif pending is not None:
+                pending = separators[index]
+            index += 1
+        if fragment:
+            yield ''.join(fragment)
+
+
+def pack_sentences(sentences, chunk_size):
+    """Group (index, sentence) pairs into newline-joined chunks no longer than chunk_size"""
+    groups = []
+    current = []
+    length = 0
+    for index, sentence in sentences:
+        if current and length + 1 + len(sentence) > chunk_size:
+            groups.append(current)
+            current = []
+            length = 0
+        length += len(sentence) + (1 if current else 0)
+        current.append((index, sentence))
+    if current:
+        groups.append(current)
+    return groups
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Future
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result, or its exception. A waiter
+    that gives up (timeout) doesn't affect anyone else, and if the running
+    caller is interrupted by something other than an Exception (a Streamlit
+    rerun stopping the script, KeyboardInterrupt) one of the waiters takes
+    over instead of failing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.counters = {'calls': 0, 'shared': 0}
+
+    def do(self, key, fn, timeout=None):
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = self._calls[key] = Future()
+                    self.counters['calls'] += 1
+                else:
+                    self.counters['shared'] += 1
+
+            if not leader:
+                try:
+                    return future.result(timeout)
+                except CancelledError:
+                    # The running caller was interrupted; retry, possibly as the new leader
+                    continue
+
+            try:
+                result = fn()
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            except BaseException:
+                future.cancel()
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                with self._lock:
+                    if self._calls.get(key) is future:
+                        del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, in_flight=len(self._calls))
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight.
+
+    The shared call runs as its own task, so cancelling one waiter (for
+    example a request hitting its deadline) leaves the others untouched;
+    the task itself is only cancelled once every waiter has gone.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.counters = {'calls': 0, 'shared': 0}
+
+    async def do(self, key, coro_fn):
+        entry = self._calls.get(key)
+        if entry is None:
+            entry = self._calls[key] = {'task': asyncio.ensure_future(coro_fn()), 'waiters': 0}
+            entry['task'].add_done_callback(lambda _, entry=entry: self._forget(key, entry))
+            self.counters['calls'] += 1
+        else:
+            self.counters['shared'] += 1
+
+        entry['waiters'] += 1
+        try:
+            return await asyncio.shield(entry['task'])
+        finally:
+            entry['waiters'] -= 1
+            if not entry['waiters'] and not entry['task'].done():
+                entry['task'].cancel()
+                self._forget(key, entry)
+
+    def _forget(self, key, entry):
+        if self._calls.get(key) is entry:
+            del self._calls[key]
+
+    def stats(self):
+        return dict(self.counters, in_flight=len(self._calls))
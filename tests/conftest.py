@@ -0,0 +1,39 @@
+import importlib.machinery
+import importlib.util
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The apps read these at import time; keep test runs out of the working tree and start no job workers
+WORKDIR = tempfile.mkdtemp(prefix='wikitranslate-tests-')
+os.environ['TRANSLATION_MEMORY_PATH'] = os.path.join(WORKDIR, 'memory.sqlite3')
+os.environ['WIKIPEDIA_CACHE_PATH'] = os.path.join(WORKDIR, 'wikipedia.sqlite3')
+os.environ['TRANSLATION_JOBS_PATH'] = os.path.join(WORKDIR, 'jobs.sqlite3')
+os.environ['TRANSLATION_INTERACTIVE_WORKERS'] = '0'
+os.environ['TRANSLATION_JOB_WORKERS'] = '0'
+
+from benchmarks.fake_upstreams import start_upstreams  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def upstreams():
+    """Two fake Lingva instances and a fake MediaWiki, answering without delay"""
+    lingva, wikipedia = start_upstreams(2, latency=0)
+    yield [server.url + '/api/v1' for server in lingva]
+    for server in lingva + [wikipedia]:
+        server.stop()
+
+
+@pytest.fixture(scope='session')
+def flask_app():
+    """The Flask server module; its file has no .py extension, so it is loaded by path"""
+    loader = importlib.machinery.SourceFileLoader('translation_server', os.path.join(ROOT, 'translation'))
+    spec = importlib.util.spec_from_loader('translation_server', loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
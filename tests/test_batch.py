@@ -0,0 +1,89 @@
+import pytest
+
+from lingva_pool import InstancePool
+from translation_memory import TranslationMemory
+
+SPANISH = "El perro de mi hermana es muy grande y come mucho todos los días."
+
+
+class ScriptedPool:
+    """Stands in for InstancePool: tags each line, or merges multi-line chunks when `merge` is set"""
+
+    def __init__(self, merge=False, fail=False):
+        self.merge = merge
+        self.fail = fail
+        self.calls = []
+
+    def translate(self, text, source_lang='auto', target_lang='en'):
+        self.calls.append(text)
+        if self.fail:
+            return None
+        lines = [f"[{target_lang}] {line}" for line in text.split('\n')]
+        return ' '.join(lines) if self.merge else '\n'.join(lines)
+
+
+@pytest.fixture
+def translator(flask_app):
+    translator = flask_app.ArticleTranslator()
+    translator.memory = TranslationMemory(db_path=None)
+    return translator
+
+
+def test_short_items_are_packed_and_realigned(translator):
+    translator.pool = ScriptedPool()
+    items = [("Good morning", 'en', 'hi'), ("Good night", 'en', 'hi'), ("Good morning", 'en', 'hi'), ("Bonjour", 'fr', 'ta')]
+    results, upstream_calls = translator.translate_batch(items)
+    assert results == [
+        ("[hi] Good morning", 'ok'), ("[hi] Good night", 'ok'), ("[hi] Good morning", 'ok'), ("[ta] Bonjour", 'ok')
+    ]
+    # One call per language pair; the duplicate isn't sent again
+    assert upstream_calls == 2
+    assert sorted(translator.pool.calls) == ["Bonjour", "Good morning\nGood night"]
+    assert translator.translate_batch(items[:1]) == ([("[hi] Good morning", 'cached')], 0)
+
+
+def test_merged_lines_are_retried_one_by_one(translator):
+    translator.pool = ScriptedPool(merge=True)
+    results, upstream_calls = translator.translate_batch([("One", 'en', 'hi'), ("Two", 'en', 'hi')])
+    assert results == [("[hi] One", 'ok'), ("[hi] Two", 'ok')]
+    assert upstream_calls == 3
+    assert translator.pool.calls[0] == "One\nTwo"
+
+
+def test_failures_keep_the_original_text(translator):
+    translator.pool = ScriptedPool(fail=True)
+    results, _ = translator.translate_batch([("One", 'en', 'hi'), ("The same", 'en', 'en')])
+    assert results == [("One", 'error'), ("The same", 'unchanged')]
+
+
+def test_long_items_that_fell_back_are_errors(translator):
+    translator.pool = ScriptedPool(fail=True)
+    text = ' '.join([SPANISH] * 20)
+    [(translation, status)], _ = translator.translate_batch([(text, 'es', 'hi')])
+    assert status == 'error'
+    assert translation == text
+
+
+def test_batch_against_fake_lingva(translator, upstreams):
+    translator.pool = InstancePool(upstreams, instance_qps=100)
+    results, upstream_calls = translator.translate_batch([("Good morning", 'en', 'hi'), ("Good night", 'en', 'hi')])
+    assert results == [("[hi] Good morning", 'ok'), ("[hi] Good night", 'ok')]
+    assert upstream_calls == 1
+
+
+def test_endpoint_reports_invalid_languages_per_item(flask_app, translator, monkeypatch):
+    translator.pool = ScriptedPool()
+    monkeypatch.setattr(flask_app, 'translator', translator)
+    response = flask_app.app.test_client().post('/translate-batch', json={'target_lang': 'hi', 'items': [
+        {'text': 'Hello', 'target_lang': None},
+        {'text': 'Hello', 'source_lang': 'xx'},
+        {'text': 'Hello', 'target_lang': 'auto'},
+        {'text': ''},
+        'Hello'
+    ]})
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == ['error', 'error', 'error', 'error', 'ok']
+    assert results[0]['error'] == 'Unsupported target language: None'
+    assert results[1]['error'] == 'Unsupported source language: xx'
+    assert results[4]['translated_text'] == '[hi] Hello'
+    assert translator.pool.calls == ['Hello']
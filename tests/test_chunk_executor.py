@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from chunk_executor import ChunkExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = ChunkExecutor(max_concurrency=2)
+    yield executor
+    executor.shutdown()
+
+
+class Tracker:
+    """translate_fn that records its threads and how many calls ran at once"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.threads = set()
+        self.calls = []
+
+    def __call__(self, chunk):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.threads.add(threading.current_thread().name)
+            self.calls.append(chunk)
+        time.sleep(self.delay * (3 if chunk == 0 else 1))
+        with self.lock:
+            self.running -= 1
+        return chunk * 10
+
+
+def test_map_keeps_order_and_bounds_concurrency(executor):
+    tracker = Tracker()
+    done = []
+    results, timings = executor.map(tracker, list(range(6)), lambda *args: done.append(args))
+    assert results == [0, 10, 20, 30, 40, 50]
+    assert all(t > 0 for t in timings)
+    assert tracker.peak == 2
+    assert [completed for completed, *_ in done] == [1, 2, 3, 4, 5, 6]
+    # The slow first chunk finished after later ones, which kept the window busy meanwhile
+    assert done[0][2] == 1 and done[1][2] == 2
+
+
+def test_imap_yields_in_order(executor):
+    tracker = Tracker()
+    assert [(i, r) for i, r, _ in executor.imap(tracker, list(range(5)))] == [(0, 0), (1, 10), (2, 20), (3, 30), (4, 40)]
+    assert tracker.peak == 2
+
+
+def test_calls_share_the_executor_threads(executor):
+    tracker = Tracker(delay=0)
+    for _ in range(5):
+        executor.map(tracker, list(range(4)))
+        list(executor.imap(tracker, list(range(4))))
+    assert len(tracker.threads) <= executor.max_workers
+
+
+def test_stopping_imap_early_drops_queued_chunks(executor):
+    tracker = Tracker()
+    translated = executor.imap(tracker, list(range(20)))
+    next(translated)
+    translated.close()
+    time.sleep(0.1)
+    assert len(tracker.calls) < 20
+
+
+def test_errors_surface_in_chunk_order(executor):
+    def translate(chunk):
+        if chunk == 2:
+            raise ValueError("boom")
+        return chunk
+
+    translated = executor.imap(translate, list(range(4)))
+    assert [next(translated)[1], next(translated)[1]] == [0, 1]
+    with pytest.raises(ValueError):
+        next(translated)
+
+
+def test_shutdown_refuses_new_work():
+    executor = ChunkExecutor()
+    executor.shutdown()
+    with pytest.raises(RuntimeError):
+        executor.map(lambda chunk: chunk, [1])
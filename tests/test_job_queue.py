@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import job_queue
+from job_queue import AsyncJobQueue, JobQueue, JobStore, PieceFailed, choose_lane, split_pieces
+
+TEXT = ' '.join(f"Sentence number {i} is long enough to make several pieces." for i in range(250))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def test_split_pieces_keeps_whole_sentences():
+    pieces = split_pieces(TEXT, 1000)
+    assert len(pieces) > 1
+    assert all(len(p.rstrip()) <= 1000 for p in pieces)
+    assert ''.join(pieces) == TEXT
+
+
+def test_split_pieces_keeps_paragraph_breaks():
+    text = f"{TEXT}\n\nA closing paragraph.\nWith a second line."
+    pieces = split_pieces(text, 1000)
+    assert ''.join(pieces) == text
+    assert pieces[-1].endswith("pieces.\n\nA closing paragraph.\nWith a second line.")
+
+
+def test_choose_lane():
+    assert choose_lane('short') == 'interactive'
+    assert choose_lane('short', 'bulk') == 'bulk'
+    assert choose_lane('x' * (job_queue.INTERACTIVE_MAX_CHARS + 1), 'interactive') == 'bulk'
+
+
+def test_identical_submits_share_a_job(store):
+    job, created = store.submit(TEXT, 'en', 'hi', 'bulk')
+    again, created_again = store.submit(TEXT, 'en', 'hi', 'bulk')
+    assert created and not created_again
+    assert again['id'] == job['id']
+    assert store.submit(TEXT, 'en', 'ta', 'bulk')[1]
+
+
+def test_claim_prefers_earlier_lanes_and_respects_the_lease(store):
+    bulk, _ = store.submit(TEXT, 'en', 'hi', 'bulk')
+    interactive, _ = store.submit('Hello there.', 'en', 'hi', 'interactive')
+    assert store.claim('a:1', job_queue.LANES)['id'] == interactive['id']
+    assert store.claim('b:2', ('interactive',)) is None
+    claimed = store.claim('b:2', job_queue.LANES)
+    assert claimed['id'] == bulk['id']
+    assert claimed['status'] == 'running' and claimed['owner'] == 'b:2'
+    assert store.claim('c:3', job_queue.LANES) is None
+
+
+def test_expired_lease_is_taken_over(store, monkeypatch):
+    job, _ = store.submit(TEXT, 'en', 'hi', 'bulk')
+    monkeypatch.setattr(job_queue, 'LEASE_SECONDS', -1)
+    store.claim('a:1', job_queue.LANES)
+    assert store.claim('b:2', job_queue.LANES)['id'] == job['id']
+    index, text = store.pending_pieces(job['id'])[0]
+    # The old owner's work is refused once the job has moved on
+    assert not store.save_piece(job['id'], index, text.upper(), 'a:1')
+    assert store.save_piece(job['id'], index, text.upper(), 'b:2')
+
+
+def test_renew_extends_the_lease(store, monkeypatch):
+    job, _ = store.submit(TEXT, 'en', 'hi', 'bulk')
+    monkeypatch.setattr(job_queue, 'LEASE_SECONDS', -1)
+    store.claim('a:1', job_queue.LANES)
+    monkeypatch.setattr(job_queue, 'LEASE_SECONDS', 60)
+    assert store.renew('a:1') == 1
+    assert store.claim('b:2', job_queue.LANES) is None
+
+
+def test_resume_skips_finished_pieces(store):
+    job, _ = store.submit(TEXT, 'en', 'hi', 'bulk')
+    store.claim('a:1', job_queue.LANES)
+    pieces = store.pending_pieces(job['id'])
+    store.save_piece(job['id'], pieces[0][0], 'first', 'a:1')
+    assert store.pending_pieces(job['id']) == pieces[1:]
+    status = store.status(job['id'])
+    assert status['progress'] == {'completed': 1, 'total': len(pieces)}
+    assert status['pieces'] == [{'index': 0, 'translated_text': 'first '}]
+
+
+def test_retry_waits_before_the_job_can_be_claimed_again(store):
+    job, _ = store.submit(TEXT, 'en', 'hi', 'bulk')
+    store.claim('a:1', job_queue.LANES)
+    assert store.retry(job['id'], 'a:1', 'upstream down') == 'queued'
+    assert store.get(job['id'])['error'] == 'upstream down'
+    assert store.claim('b:2', job_queue.LANES) is None
+
+
+def test_retry_keeps_pieces_and_fails_after_max_attempts(store, monkeypatch):
+    monkeypatch.setattr(job_queue, 'RETRY_DELAY', -1)
+    job, _ = store.submit(TEXT, 'en', 'hi', 'bulk')
+    store.claim('a:1', job_queue.LANES)
+    store.save_piece(job['id'], 0, 'first', 'a:1')
+    statuses = [store.retry(job['id'], 'a:1', 'upstream down')]
+    while statuses[-1] == 'queued':
+        assert store.claim('a:1', job_queue.LANES)['id'] == job['id']
+        statuses.append(store.retry(job['id'], 'a:1', 'upstream down'))
+    assert statuses == ['queued'] * (job_queue.MAX_ATTEMPTS - 1) + ['failed']
+    assert store.pieces(job['id']) == [(0, 'first ')]
+    # A failed job isn't handed back to a new identical submit
+    assert store.submit(TEXT, 'en', 'hi', 'bulk')[1]
+
+
+def test_release_orphans_requeues_dead_owners(store):
+    job, _ = store.submit(TEXT, 'en', 'hi', 'bulk')
+    store.claim('host:999999999', job_queue.LANES)
+    assert store.release_orphans('host') == 1
+    assert store.get(job['id'])['status'] == 'queued'
+
+
+def test_queue_retries_a_failed_piece_and_resumes(store, monkeypatch):
+    monkeypatch.setattr(job_queue, 'POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(job_queue, 'RETRY_DELAY', 0)
+    calls = []
+    lock = threading.Lock()
+
+    def translate(text, source_lang, target_lang):
+        with lock:
+            calls.append(text)
+            if len(calls) == 2:
+                raise PieceFailed("Translation failed for 1 of 9 sentences - using original text")
+        return f"[{target_lang}] {text}"
+
+    queue = JobQueue(store, translate, interactive_workers=0, bulk_workers=1)
+    queue.start()
+    job, _ = queue.submit(TEXT, 'en', 'hi')
+    deadline = time.monotonic() + 10
+    while store.get(job['id'])['status'] != 'done':
+        assert time.monotonic() < deadline, store.get(job['id'])
+        time.sleep(0.02)
+
+    pieces = split_pieces(TEXT)
+    # The failed piece ran twice; the one before it wasn't translated again
+    assert calls == [pieces[0], pieces[1]] + pieces[1:]
+    done = store.status(job['id'])
+    assert done['translated_text'] == ''.join(f"[hi] {p}" for p in pieces)
+    assert store.get(job['id'])['attempts'] == 1
+
+
+def test_job_events_end_with_an_error_when_the_job_is_purged(flask_app, store, monkeypatch):
+    monkeypatch.setattr(flask_app.job_queue, 'store', store)
+    assert list(flask_app.job_events('missing')) == [{'event': 'error', 'job_id': 'missing', 'error': 'Job not found'}]
+
+    job, _ = store.submit(TEXT, 'en', 'hi', 'bulk')
+    events = flask_app.job_events(job['id'], interval=0)
+    assert next(events)['event'] == 'start'
+    store.cancel(job['id'])
+    assert store.purge(max_age=-1) == 1
+    assert list(events) == [{'event': 'error', 'job_id': job['id'], 'error': 'Job not found'}]
+
+
+def test_job_workers_start_with_the_first_request(flask_app, monkeypatch):
+    started = []
+    monkeypatch.setattr(flask_app.job_queue, 'start', lambda: started.append(True))
+    assert not started
+    flask_app.app.test_client().get('/languages')
+    assert started
+
+
+def test_drain_finishes_the_current_piece_and_requeues_the_job(store):
+    started = []
+
+    async def translate(text, source_lang, target_lang):
+        started.append(text)
+        await asyncio.sleep(0.2)
+        return f"[{target_lang}] {text}"
+
+    async def run():
+        queue = AsyncJobQueue(store, translate, interactive_workers=0, bulk_workers=1)
+        await queue.start()
+        job, _ = await queue.submit(TEXT, 'en', 'hi')
+        while not started:
+            await asyncio.sleep(0.01)
+        await queue.drain(5)
+        await queue.close()
+        return job
+
+    job = asyncio.run(run())
+    assert len(started) == 1
+    drained = store.get(job['id'])
+    assert (drained['status'], drained['owner'], drained['completed']) == ('queued', None, 1)
+    assert store.pending_pieces(job['id']) == list(enumerate(split_pieces(TEXT)))[1:]
+    assert store.claim('b:2', job_queue.LANES)['id'] == job['id']
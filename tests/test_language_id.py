@@ -0,0 +1,71 @@
+import pytest
+
+from language_id import detect, detect_language, language_runs, source_language
+
+SPANISH = "El perro de mi hermana es muy grande y come mucho todos los días."
+ENGLISH = "The weather is nice today and I like it very much indeed."
+HINDI = "भारत एक विशाल देश है और यहाँ की संस्कृति बहुत पुरानी है।"
+
+
+@pytest.mark.parametrize('text, expected', [
+    (HINDI, 'hi'),
+    ("महाराष्ट्र हे भारतातील एक राज्य आहे आणि मुंबई ही त्याची राजधानी आहे.", 'mr'),
+    ("पुणे शहरातील शाळा", 'mr'),
+    ("नेपाल एक सुन्दर देश हो र काठमाडौं यसको राजधानी हो।", 'ne'),
+    ("বাংলাদেশ দক্ষিণ এশিয়ার একটি দেশ।", 'bn'),
+    ("অসমৰ ৰাজধানী দিছপুৰ।", 'as'),
+    ("القاهرة هي عاصمة مصر وأكبر مدنها.", 'ar'),
+    ("پاکستان کا دارالحکومت اسلام آباد ہے۔", 'ur'),
+    ("சென்னை தமிழ்நாட்டின் தலைநகரம்.", 'ta'),
+    ("東京は日本の首都です。", 'ja'),
+    ("北京是中国的首都。", 'zh'),
+    (SPANISH, 'es'),
+    (ENGLISH, 'en'),
+    ("Le chat est sur la table et il dort dans le salon.", 'fr'),
+    ("Der Hund ist nicht mit dem Auto in die Stadt gefahren.", 'de'),
+])
+def test_detect(text, expected):
+    assert detect(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    "",
+    "1984 - 2024",
+    "OK",
+    "Paris",
+    "Taj Mahal",
+])
+def test_short_or_ambiguous_text_is_undecided(text):
+    assert detect(text) is None
+
+
+def test_devanagari_without_marker_words_defaults_to_hindi():
+    lang, confidence = detect_language("दिल्ली")
+    assert lang == 'hi' and confidence == 1.0
+
+
+def test_source_language():
+    assert source_language(SPANISH, 'fr') == 'fr'
+    assert source_language(SPANISH) == 'es'
+    assert source_language("OK") == 'auto'
+
+
+def test_language_runs_split_a_mixed_document():
+    sentences = [ENGLISH, ENGLISH, ENGLISH, HINDI, "2024.", SPANISH, ENGLISH]
+    assert language_runs(sentences) == [
+        ('en', [ENGLISH, ENGLISH, ENGLISH]),
+        ('hi', [HINDI]),
+        # Sentences with nothing to go on take the document's language
+        ('en', ["2024."]),
+        ('es', [SPANISH]),
+        ('en', [ENGLISH])
+    ]
+
+
+def test_language_runs_with_an_explicit_source_are_one_run():
+    assert language_runs([ENGLISH, HINDI], 'en') == [('en', [ENGLISH, HINDI])]
+
+
+def test_language_runs_without_anything_to_detect():
+    assert language_runs([]) == []
+    assert language_runs(["OK", "1984"]) == [('auto', ["OK", "1984"])]
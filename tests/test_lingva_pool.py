@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+import lingva_pool
+from benchmarks.fake_upstreams import Behaviour, FakeLingvaHandler, FakeServer
+from lingva_pool import InstanceHealth, InstancePool
+
+
+@pytest.fixture
+def lingva():
+    """Starts fake Lingva servers with the given behaviours; stops them after the test"""
+    servers = []
+
+    def start(*behaviours):
+        started = [FakeServer(FakeLingvaHandler, behaviour).start() for behaviour in behaviours]
+        servers.extend(started)
+        return started
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def api_urls(servers):
+    return [server.url + '/api/v1' for server in servers]
+
+
+def requests_to(server):
+    return server.behaviour.stats()['requests']
+
+
+def test_fails_over_to_a_healthy_instance(lingva):
+    broken, healthy = lingva(Behaviour(latency=0, error_rate=1), Behaviour(latency=0))
+    pool = InstancePool(api_urls([broken, healthy]), instance_qps=100)
+    assert pool.translate("Hello", 'en', 'hi') == "[hi] Hello"
+    assert (requests_to(broken), requests_to(healthy)) == (1, 1)
+    # The failure counts against the broken instance, so the next request goes straight to the healthy one
+    assert pool.translate("Goodbye", 'en', 'hi') == "[hi] Goodbye"
+    assert (requests_to(broken), requests_to(healthy)) == (1, 2)
+
+
+def test_every_instance_failing_returns_none(lingva):
+    [broken] = lingva(Behaviour(latency=0, error_rate=1))
+    pool = InstancePool(api_urls([broken]), instance_qps=100)
+    assert pool.translate("Hello", 'en', 'hi') is None
+
+
+def test_circuit_opens_half_opens_and_closes(lingva):
+    [server] = lingva(Behaviour(latency=0, error_rate=1))
+    pool = InstancePool(api_urls([server]), instance_qps=100, failure_threshold=2, reset_timeout=0.2)
+    health = pool.instances[0]
+
+    assert pool.translate("One", 'en', 'hi') is None
+    assert health.state == InstanceHealth.CLOSED
+    assert pool.translate("Two", 'en', 'hi') is None
+    assert health.state == InstanceHealth.OPEN
+    # While open, requests fail fast without reaching the instance
+    assert pool.translate("Three", 'en', 'hi') is None
+    assert requests_to(server) == 2
+
+    # After reset_timeout a single probe is let through; a failed probe opens the circuit again
+    time.sleep(0.25)
+    assert pool.translate("Four", 'en', 'hi') is None
+    assert requests_to(server) == 3
+    assert health.state == InstanceHealth.OPEN
+
+    time.sleep(0.25)
+    assert pool.select(set()) == 0
+    assert health.state == InstanceHealth.HALF_OPEN
+    assert pool.select(set()) is None
+    pool.release(0)
+
+    # A successful probe closes it
+    server.behaviour.error_rate = 0
+    assert pool.translate("Five", 'en', 'hi') == "[hi] Five"
+    assert health.state == InstanceHealth.CLOSED
+    assert health.consecutive_failures == 0
+
+
+def test_slow_requests_are_hedged(lingva):
+    slow, fast = lingva(Behaviour(latency=2), Behaviour(latency=0))
+    pool = InstancePool(api_urls([slow, fast]), instance_qps=100, hedge=True, hedge_min_delay=0.2)
+    # Latency history that ranks the slow instance first and puts its hedge delay at the minimum
+    pool.record(0, latency=0.05)
+    pool.record(1, latency=0.1)
+    started = time.monotonic()
+    assert pool.translate("Hello", 'en', 'hi') == "[hi] Hello"
+    assert 0.2 <= time.monotonic() - started < 1
+    assert (requests_to(slow), requests_to(fast)) == (1, 1)
+
+
+def test_hedge_delay_counts_from_the_actual_send(lingva, monkeypatch):
+    monkeypatch.setattr(lingva_pool, 'HEDGE_WORKERS', 1)
+    primary, backup = lingva(Behaviour(latency=0), Behaviour(latency=0))
+    pool = InstancePool(api_urls([primary, backup]), instance_qps=100, hedge=True, hedge_min_delay=0.2)
+    pool.record(0, latency=0.05)
+    pool.record(1, latency=0.1)
+    assert pool.hedge_delay(0) == 0.2
+    # Keep the only hedge thread busy for longer than the hedge delay
+    release = threading.Event()
+    pool._hedge_executor.submit(release.wait)
+    results = []
+    worker = threading.Thread(target=lambda: results.append(pool.translate("Hello", 'en', 'hi')))
+    worker.start()
+    time.sleep(0.4)
+    release.set()
+    worker.join(5)
+    # Let anything still queued run before counting requests
+    pool._hedge_executor.shutdown(wait=True)
+
+    assert results == ["[hi] Hello"]
+    # Time spent queued for a thread isn't latency, so the fast primary wasn't hedged
+    assert (requests_to(primary), requests_to(backup)) == (1, 0)
+
+
+def test_requests_session_is_only_created_when_sending(lingva):
+    [server] = lingva(Behaviour(latency=0))
+    pool = InstancePool(api_urls([server]), instance_qps=100)
+    pool.record(pool.select(set()), latency=0.01)
+    assert pool._session is None
+    assert pool.translate("Hello", 'en', 'hi') == "[hi] Hello"
+    assert pool._session is pool.session
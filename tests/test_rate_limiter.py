@@ -0,0 +1,92 @@
+import email.utils
+import time
+
+import pytest
+
+from benchmarks.fake_upstreams import Behaviour, FakeLingvaHandler, FakeServer
+from lingva_pool import AdaptiveRateLimiter, InstanceHealth, InstancePool, parse_retry_after
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('120', 120),
+    ('0', 0),
+    ('-5', 0),
+    (email.utils.formatdate(time.time() - 60, usegmt=True), 0),
+    ('soon', None),
+    ('', None),
+    (None, None),
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    value = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 28 <= parse_retry_after(value) <= 30
+
+
+def test_throttle_cuts_the_rate_once_per_burst():
+    limiter = AdaptiveRateLimiter(4)
+    limiter.on_throttle()
+    assert limiter.rate == 2
+    # Concurrent 429s from the same overload count as one cut
+    limiter.on_throttle()
+    assert limiter.rate == 2
+    assert limiter.throttled == 2
+
+
+def test_success_recovers_additively_up_to_the_ceiling():
+    limiter = AdaptiveRateLimiter(2, increase=0.5)
+    limiter.on_success()
+    assert limiter.rate == 2.5
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == limiter.max_rate == 8
+
+
+def test_cuts_stop_at_the_floor():
+    limiter = AdaptiveRateLimiter(1, min_rate=0.25)
+    for _ in range(10):
+        limiter.cut_at = 0.0  # as if the last cut was long ago
+        limiter.on_error()
+        limiter.cut_at = 0.0
+        limiter.on_throttle(0)
+    assert limiter.rate == 0.25
+
+
+def test_retry_after_pauses_the_bucket():
+    limiter = AdaptiveRateLimiter(10)
+    delay = limiter.on_throttle(retry_after=2)
+    assert 2 <= delay <= 2.4
+    assert not limiter.try_acquire()
+    assert limiter.wait_time() >= 1.9
+    assert limiter.snapshot()['paused_for'] >= 1.9
+
+
+def test_backoff_without_retry_after_grows():
+    limiter = AdaptiveRateLimiter(10, backoff_base=1.0)
+    first = limiter.on_throttle()
+    limiter.cut_at = 0.0
+    second = limiter.on_throttle()
+    assert 0.5 <= first <= 1
+    assert 1 <= second <= 2
+
+
+def test_pool_backs_off_a_rate_limited_instance():
+    server = FakeServer(FakeLingvaHandler, Behaviour(latency=0, rate_limit=1)).start()
+    try:
+        pool = InstancePool([server.url + '/api/v1'], instance_qps=100)
+        bucket = pool.instances[0].bucket
+        for i in range(5):
+            started = time.monotonic()
+            assert pool.translate(f"Hello {i}", 'en', 'hi') == f"[hi] Hello {i}"
+            if bucket.throttled:
+                break
+        # The 429's Retry-After: 1 was honoured before the retry that succeeded
+        assert bucket.throttled == 1
+        assert time.monotonic() - started >= 1
+        assert bucket.rate < 100
+        assert pool.instances[0].state == InstanceHealth.CLOSED
+        assert server.behaviour.stats()['throttled'] == 1
+    finally:
+        server.stop()
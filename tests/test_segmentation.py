@@ -0,0 +1,63 @@
+import pytest
+
+from segmentation import join_segments, pack_sentences, segment, segment_lines, split_long, split_sentences
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("One. Two! Three? Four", ["One.", "Two!", "Three?", "Four"]),
+    ("Dr. Smith arrived at 5 p.m. and left. Then it rained.", ["Dr. Smith arrived at 5 p.m. and left.", "Then it rained."]),
+    ("J. R. R. Tolkien wrote books. They sold.", ["J. R. R. Tolkien wrote books.", "They sold."]),
+    ("It grew e.g. fast. it kept going", ["It grew e.g. fast. it kept going"]),
+    ('He said "Stop." Then he left.', ['He said "Stop."', "Then he left."]),
+    ("भारत एक देश है। यह बड़ा है।दिल्ली राजधानी है", ["भारत एक देश है।", "यह बड़ा है।", "दिल्ली राजधानी है"]),
+    ("今日は晴れです。明日は雨です。", ["今日は晴れです。", "明日は雨です。"]),
+    ("First paragraph\n\nSecond paragraph", ["First paragraph", "Second paragraph"]),
+    ("   ", []),
+])
+def test_split_sentences(text, expected):
+    assert split_sentences(text) == expected
+
+
+def test_split_long_prefers_clause_marks():
+    sentence = "alpha beta gamma, " * 20
+    pieces = split_long(sentence.strip(), 100)
+    assert all(len(p) <= 100 for p in pieces)
+    assert all(p.endswith(',') for p in pieces[:-1])
+    assert ' '.join(pieces) == sentence.strip()
+
+
+def test_split_long_without_spaces_cuts_anywhere():
+    assert split_long('x' * 250, 100) == ['x' * 100, 'x' * 100, 'x' * 50]
+
+
+def test_segment_keeps_every_piece_under_the_limit():
+    text = "Short one. Long " + "word " * 400 + "end. Another short one."
+    pieces = segment(text, 200)
+    assert all(len(p) <= 200 for p in pieces)
+    assert pieces[0] == "Short one."
+    assert pieces[-1] == "Another short one."
+    assert ' '.join(pieces).split() == text.split()
+
+
+def test_segment_lines_remembers_the_layout():
+    text = "Intro one. Intro two.\n\nSecond para line\nwrapped line. Next.\n\n\n  Third."
+    segments, separators = segment_lines(text)
+    assert segments == ["Intro one.", "Intro two.", "Second para line", "wrapped line.", "Next.", "Third."]
+    assert separators == [' ', '\n\n', '\n', ' ', '\n\n', '']
+    assert ''.join(join_segments([segments[:2], segments[2:]], separators)) == (
+        "Intro one. Intro two.\n\nSecond para line\nwrapped line. Next.\n\nThird."
+    )
+
+
+def test_join_segments_skips_merged_sentences():
+    _, separators = segment_lines("One.\n\nTwo. Three.\nFour.")
+    fragments = list(join_segments([['[hi] One.'], ['[hi] Two. Three.', ''], ['[hi] Four.']], separators))
+    # Each fragment carries the break before it, so streamed fragments simply concatenate
+    assert fragments == ['[hi] One.', '\n\n[hi] Two. Three.', '\n[hi] Four.']
+
+
+def test_pack_sentences_keeps_order_and_size():
+    sentences = list(enumerate(['a' * 5, 'b' * 5, 'c' * 5, 'd' * 20]))
+    groups = pack_sentences(sentences, 11)
+    assert groups == [[(0, 'aaaaa'), (1, 'bbbbb')], [(2, 'ccccc')], [(3, 'd' * 20)]]
+    assert [i for group in groups for i, _ in group] == [0, 1, 2, 3]
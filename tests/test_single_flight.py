@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_concurrent_callers_share_one_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', fn))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.counters['shared'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ['result'] * 5
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_waiters_share_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError('upstream down')
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('key', fn)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.counters['shared'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert len(errors) == 3
+    assert all(e is errors[0] for e in errors)
+
+
+def test_failures_are_not_remembered():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError('down')
+
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 'ok') == 'ok'
+
+
+def test_interrupted_leader_hands_over_to_a_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def interrupted():
+        release.wait(5)
+        raise KeyboardInterrupt
+
+    leader = threading.Thread(target=lambda: pytest.raises(KeyboardInterrupt, flight.do, 'key', interrupted))
+    leader.start()
+    wait_for(lambda: flight.stats()['in_flight'] == 1)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(flight.do('key', lambda: 'taken over')))
+    waiter.start()
+    wait_for(lambda: flight.counters['shared'] == 1)
+    release.set()
+    leader.join()
+    waiter.join()
+    assert results == ['taken over']
+
+
+def test_async_waiters_share_the_exception():
+    async def main():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            raise ValueError('upstream down')
+
+        results = await asyncio.gather(*(flight.do('key', fn) for _ in range(3)), return_exceptions=True)
+        assert calls == [1]
+        assert all(isinstance(r, ValueError) for r in results)
+
+    asyncio.run(main())
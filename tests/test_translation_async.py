@@ -0,0 +1,19 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import translation_async
+
+
+def test_requests_after_shutdown_began_are_turned_away():
+    async def run():
+        app = translation_async.create_app()
+        async with TestClient(TestServer(app)) as client:
+            assert (await client.get('/languages')).status == 200
+            await translation_async.on_shutdown(app)
+            response = await client.get('/languages')
+            return response.status, response.headers.get('Retry-After'), await response.json()
+
+    status, retry_after, body = asyncio.run(run())
+    assert (status, retry_after) == (503, '5')
+    assert body == {'error': 'Server is shutting down'}
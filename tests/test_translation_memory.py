@@ -0,0 +1,98 @@
+import metrics
+from translation_memory import (
+    TranslationMemory, TranslationReport, apply_group_translation, iter_translate_detected, iter_translate_with_memory
+)
+
+SPANISH = "El perro de mi hermana es muy grande y come mucho todos los días."
+ENGLISH = "The weather is nice today and I like it very much indeed."
+
+
+def tag_lines(chunks):
+    return ['\n'.join(f"[hi] {line}" for line in chunk.split('\n')) for chunk in chunks]
+
+
+def test_lines_are_realigned_and_cached_per_sentence(tmp_path):
+    memory = TranslationMemory(str(tmp_path / 'memory.sqlite3'))
+    group = [(0, 'One.'), (1, 'Two.')]
+    results = [None, None]
+    report = TranslationReport()
+    assert apply_group_translation(memory, group, "[hi] One.\n\n[hi] Two.\n", results, 'en', 'hi', report)
+    assert results == ['[hi] One.', '[hi] Two.']
+    assert memory.get('Two.', 'en', 'hi') == '[hi] Two.'
+    assert report.failed == report.uncached == 0
+
+
+def test_merged_lines_are_kept_but_not_cached():
+    memory = TranslationMemory(db_path=None)
+    results = [None, None]
+    report = TranslationReport()
+    assert apply_group_translation(memory, [(0, 'One.'), (1, 'Two.')], "[hi] One. Two.", results, 'en', 'hi', report)
+    assert results == ['[hi] One. Two.', '']
+    assert memory.get('One.', 'en', 'hi') is None
+    assert report.uncached == 2
+
+
+def test_failed_chunks_fall_back_and_are_reported():
+    memory = TranslationMemory(db_path=None)
+    results = [None, None]
+    report = TranslationReport()
+    report.sentences = 2
+    assert not apply_group_translation(memory, [(0, 'One.'), (1, 'Two.')], None, results, 'en', 'hi', report)
+    assert results == ['One.', 'Two.']
+    assert report.failed == 2
+    assert report.failure_message() == "Translation failed for 2 of 2 sentences - using original text"
+
+
+def test_only_missing_sentences_go_upstream():
+    memory = TranslationMemory(db_path=None)
+    memory.put('Two.', 'en', 'hi', '[hi] cached')
+    sent = []
+
+    def translate_chunks(chunks):
+        sent.extend(chunks)
+        return tag_lines(chunks)
+
+    pieces = list(iter_translate_with_memory(memory, ['One.', 'Two.', 'Three.'], 'en', 'hi', 800, translate_chunks))
+    assert sent == ['One.\nThree.']
+    assert [s for piece in pieces for s in piece] == ['[hi] One.', '[hi] cached', '[hi] Three.']
+
+
+def test_report_counts_unchanged_and_failed_runs():
+    memory = TranslationMemory(db_path=None)
+    report = TranslationReport()
+    pieces = list(iter_translate_detected(
+        memory, [SPANISH, ENGLISH], 'auto', 'en', 800, lambda chunks, lang: [None] * len(chunks), report
+    ))
+    assert [s for piece in pieces for s in piece] == [SPANISH, ENGLISH]
+    assert (report.sentences, report.unchanged, report.failed) == (2, 1, 1)
+    assert not report.all_unchanged
+
+
+def test_text_already_in_target_language_is_all_unchanged():
+    report = TranslationReport()
+    list(iter_translate_detected(
+        TranslationMemory(db_path=None), [ENGLISH], 'auto', 'en', 800, lambda chunks, lang: tag_lines(chunks), report
+    ))
+    assert report.all_unchanged
+
+
+def test_long_text_keeps_its_paragraphs(flask_app):
+    translator = flask_app.ArticleTranslator()
+    translator.memory = TranslationMemory(db_path=None)
+    translator.pool.translate = lambda text, source_lang, target_lang: tag_lines([text])[0]
+    text = '\n\n'.join([' '.join([ENGLISH] * 16), f"{ENGLISH}\n{ENGLISH}"])
+    translated = translator.translate_long_text(text, 'hi', 'en')
+    assert translated.split('\n\n') == [' '.join([f"[hi] {ENGLISH}"] * 16), f"[hi] {ENGLISH}\n[hi] {ENGLISH}"]
+    assert ''.join(translator.stream_long_text(text, 'hi', 'en')) == translated
+
+
+def test_long_and_streamed_text_are_timed_separately(flask_app):
+    translator = flask_app.ArticleTranslator()
+    translator.memory = TranslationMemory(db_path=None)
+    translator.pool.translate = lambda text, source_lang, target_lang: tag_lines([text])[0]
+    text = ' '.join([ENGLISH] * 16)
+    metrics.reset()
+    translator.translate_long_text(text, 'hi', 'en')
+    list(translator.stream_long_text(text, 'hi', 'en'))
+    counts = {s['path']: s['count'] for s in metrics.snapshot()['histograms']['translate_seconds']}
+    assert counts == {'long': 1, 'stream': 1}
@@ -0,0 +1,112 @@
+import pytest
+
+from benchmarks.fake_upstreams import Behaviour, FakeServer, FakeWikipediaHandler
+from wikipedia_client import USER_AGENT, WikipediaClient, html_to_text, normalize_title
+
+
+@pytest.fixture
+def wiki():
+    server = FakeServer(FakeWikipediaHandler, Behaviour(latency=0)).start()
+    yield server
+    server.stop()
+
+
+def make_client(wiki, tmp_path, **kwargs):
+    client = WikipediaClient(wiki.url + '/w/api.php', cache_path=str(tmp_path / 'wikipedia.sqlite3'), **kwargs)
+    client.sent = []
+    client.session.hooks['response'].append(lambda response, **_: client.sent.append(response))
+    return client
+
+
+def test_identifies_itself(wiki, tmp_path):
+    client = make_client(wiki, tmp_path)
+    client.resolve_titles(['India'])
+    assert client.sent[0].request.headers['User-Agent'] == USER_AGENT
+
+
+def test_normalize_title():
+    assert normalize_title('  taj_mahal  ') == 'Taj mahal'
+    assert normalize_title('new   Delhi') == 'New Delhi'
+
+
+def test_resolve_titles_follows_redirects_in_one_query(wiki, tmp_path):
+    client = make_client(wiki, tmp_path)
+    resolved = client.resolve_titles(['UK', 'india', 'Missing page', ' '])
+    assert resolved == {
+        'UK': {'title': 'United Kingdom', 'revision': 1},
+        'india': {'title': 'India', 'revision': 1},
+        'Missing page': None
+    }
+    assert len(client.sent) == 1
+
+
+def test_fresh_outlines_need_no_network(wiki, tmp_path):
+    client = make_client(wiki, tmp_path)
+    outline = client.get_outline('Bharat')
+    assert outline['title'] == 'India'
+    assert outline['intro'] and outline['sections']
+    sent = len(client.sent)
+    assert client.get_outline('India') == outline
+    assert client.get_outline('Bharat') == outline
+    assert len(client.sent) == sent
+    assert client.get_outline('Missing page') is None
+
+
+def test_stale_outline_costs_one_revision_check(wiki, tmp_path):
+    client = make_client(wiki, tmp_path, revalidate_after=0)
+    outline = client.get_outline('India')
+    sent = len(client.sent)
+    assert client.get_outline('India') == outline
+    assert [r.request.url for r in client.sent[sent:]] == [client.sent[0].request.url]
+
+
+def test_edited_article_is_refetched(wiki, tmp_path):
+    client = make_client(wiki, tmp_path, revalidate_after=0)
+    assert client.get_outline('India')['revision'] == 1
+    wiki.revisions['India'] = 2
+    assert client.get_outline('India')['revision'] == 2
+
+
+def test_unchanged_section_is_revalidated_with_etag(wiki, tmp_path):
+    client = make_client(wiki, tmp_path)
+    text = client.get_section('India', 1, revision=1)
+    assert text and client.sent[-1].headers['ETag']
+    # Same revision: served from the cache
+    sent = len(client.sent)
+    assert client.get_section('India', 1, revision=1) == text
+    assert len(client.sent) == sent
+    # New revision: a conditional request, answered 304 since this section didn't change
+    assert client.get_section('India', 1, revision=2) == text
+    assert client.sent[-1].status_code == 304
+    assert client.sent[-1].request.headers['If-None-Match'] == client.sent[0].headers['ETag']
+    assert wiki.behaviour.not_modified == 1
+    assert client.get_section('India', 1, revision=2) == text
+    assert wiki.behaviour.not_modified == 1
+
+
+def test_html_to_text_keeps_paragraphs_and_drops_chrome():
+    html = (
+        '<p>First <b>para</b><sup class="reference">[1]</sup>.</p>'
+        '<table><tr><td>skipped</td></tr></table>'
+        '<p>Second para.</p>'
+    )
+    assert html_to_text(html) == 'First para.\n\nSecond para.'
+
+
+def test_sections_stop_at_their_first_subheading(wiki, tmp_path):
+    client = make_client(wiki, tmp_path)
+    sections = client.get_outline('India')['sections']
+    assert [(s['index'], s['level']) for s in sections] == [(1, 2), (2, 3), (3, 2), (4, 3), (5, 2)]
+    texts = [client.get_section('India', s['index'], 1) for s in sections]
+    assert all(texts)
+    # No subsection's text also shows up inside its parent
+    for i, text in enumerate(texts):
+        assert all(other not in text for j, other in enumerate(texts) if j != i)
+
+
+def test_lead_only_extraction():
+    html = '<h2>History</h2><p>Lead.</p><h3>Early life</h3><p>Nested.</p>'
+    assert html_to_text(html) == 'Lead.\n\nNested.'
+    assert html_to_text(html, lead_only=True) == 'Lead.'
+    # Without its own heading, the first heading after text ends the lead
+    assert html_to_text('<p>Lead.</p><h3>Early life</h3><p>Nested.</p>', lead_only=True) == 'Lead.'
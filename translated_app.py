@@ -1,17 +1,29 @@
 import streamlit as st
-import requests
-import urllib.parse
-import time
-from PIL import Image
-
-# Handle pytesseract import with fallback
-try:
-    import pytesseract
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
+import io
+import hashlib
+import importlib.util
+import threading
+
+import metrics
+from chunk_executor import ChunkExecutor
+from lingva_pool import DEFAULT_INSTANCES, MAX_CHUNK_CHARS, InstancePool
+from language_id import source_language
+from segmentation import join_segments, segment_lines
+from translation_memory import TranslationMemory, TranslationReport, iter_translate_detected
+from wikipedia_client import WikipediaClient
+
+# pytesseract, PIL and the OCR modules are only imported once the image tab is used
+OCR_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('pytesseract', 'PIL'))
+if not OCR_AVAILABLE:
     st.warning("⚠️ OCR functionality is currently unavailable.")
 
+UNAVAILABLE_PREFIX = "Translation unavailable."
+# Bounds for memoized Wikipedia lookups and translations shared across sessions
+WIKIPEDIA_TTL = 3600
+TRANSLATION_TTL = 6 * 3600
+# Finished results kept per session, so widget changes don't throw them away
+RESULTS_KEPT = 32
+
 # Page configuration
 st.set_page_config(
     page_title="Universal Language Translator",
@@ -20,13 +32,15 @@ st.set_page_config(
 )
 
 class UniversalTranslator:
-    def __init__(self):
-        self.lingva_instances = [
-            "https://lingva.ml/api/v1",
-            "https://translate.igodo.eu/api/v1",
-            "https://translate.plausibility.cloud/api/v1"
-        ]
-        self.current_instance = 0
+    def __init__(self, max_concurrency=4, instance_qps=2.0, hedge=False):
+        self.lingva_instances = list(DEFAULT_INSTANCES)
+        # Shared with the API server: picks the fastest healthy instance, with circuit breakers
+        self.pool = InstancePool(self.lingva_instances, instance_qps=instance_qps, hedge=hedge)
+        self.chunk_executor = ChunkExecutor(max_concurrency)
+        self.memory = TranslationMemory()
+        self.wikipedia = WikipediaClient()
+        self._ocr = None
+        self._ocr_lock = threading.Lock()
         
         self.languages = {
             'auto': 'Auto-detect', 'en': 'English', 'hi': 'Hindi', 'te': 'Telugu',
@@ -39,176 +53,187 @@ class UniversalTranslator:
             'sv': 'Swedish', 'da': 'Danish', 'no': 'Norwegian', 'fi': 'Finnish'
         }
 
-    def translate_text(self, text, source_lang='auto', target_lang='en'):
+    @property
+    def ocr(self):
+        """The OCR pipeline, built (and pytesseract imported) on first use"""
+        with self._ocr_lock:
+            if self._ocr is None:
+                from ocr_pipeline import OcrPipeline
+                self._ocr = OcrPipeline()
+            return self._ocr
+
+    @metrics.timed('translate_seconds', path='text')
+    def translate_text(self, text, source_lang='auto', target_lang='en', report=None):
         """Core translation function with fallback support"""
         if not text or not text.strip():
             return "No text to translate"
         
-        # If source and target are the same, return original
-        if source_lang == target_lang and source_lang != 'auto':
+        # Longer text would be cut off by the upstream limit, so chunk it instead
+        if len(text) > MAX_CHUNK_CHARS:
+            return self.translate_long_content(text, target_lang, source_lang, report=report)
+        
+        if report is None:
+            report = TranslationReport()
+        report.sentences += 1
+        # Text already in the target language needs no upstream call
+        source_lang = source_language(text, source_lang)
+        if source_lang == target_lang:
+            report.unchanged += 1
             return text
-            
-        for attempt in range(len(self.lingva_instances)):
-            try:
-                base_url = self.lingva_instances[self.current_instance]
-                text_chunk = text.strip()[:1000]  # Limit chunk size
-                encoded_text = urllib.parse.quote(text_chunk)
-                
-                url = f"{base_url}/{source_lang}/{target_lang}/{encoded_text}"
-                response = requests.get(url, timeout=15)
-                response.raise_for_status()
-                
-                data = response.json()
-                translation = data.get('translation', '').strip()
-                
-                if translation and translation != text_chunk:
-                    return translation
-                elif translation:
-                    return translation
-                    
-            except Exception as e:
-                self.current_instance = (self.current_instance + 1) % len(self.lingva_instances)
-                if attempt < len(self.lingva_instances) - 1:
-                    time.sleep(1)
         
-        return f"Translation unavailable. Original: {text[:200]}{'...' if len(text) > 200 else ''}"
+        cached = self.memory.get(text, source_lang, target_lang)
+        if cached is not None:
+            return cached
+        
+        translation = self.pool.translate(text, source_lang, target_lang)
+        if translation:
+            self.memory.put(text, source_lang, target_lang, translation)
+            return translation
+        
+        report.failed += 1
+        return f"{UNAVAILABLE_PREFIX} Original: {text[:200]}{'...' if len(text) > 200 else ''}"
 
-    def translate_long_content(self, text, target_lang, source_lang='auto', chunk_size=700):
+    @metrics.timed('translate_seconds', path='long')
+    def translate_long_content(self, text, target_lang, source_lang='auto', chunk_size=700, report=None):
         """Translate long content by intelligent chunking"""
         if not text or not text.strip():
             return "No content to translate"
         
-        # If target is English and source is auto, and text appears to be English, return as is
-        if target_lang == 'en' and source_lang == 'auto' and self._is_likely_english(text):
-            return text
-        
         if len(text) <= chunk_size:
-            return self.translate_text(text, source_lang, target_lang)
+            return self.translate_text(text, source_lang, target_lang, report)
         
-        # Smart sentence splitting
-        sentences = self._smart_sentence_split(text)
+        # Smart sentence splitting, keeping the line and paragraph layout
+        sentences, separators = segment_lines(text, chunk_size)
         
-        chunks = []
-        current_chunk = ""
+        def translate_chunks(chunks, source_lang):
+            # Show progress for long translations
+            if len(chunks) > 3:
+                progress_bar = st.progress(0)
+                status_text = st.empty()
+            
+            def on_done(completed, total, index, seconds):
+                if total > 3:
+                    status_text.text(f"Translated chunk {index+1} of {total} in {seconds:.2f}s ({completed}/{total} done)")
+                    progress_bar.progress(completed / total)
+            
+            # Chunks are translated concurrently; the pool's per-instance rate limiter replaces fixed sleeps
+            translated_chunks, _ = self.chunk_executor.map(
+                lambda chunk: self.pool.translate(chunk, source_lang, target_lang),
+                chunks,
+                on_done
+            )
+            
+            if len(chunks) > 3:
+                progress_bar.empty()
+                status_text.empty()
+            
+            return translated_chunks
         
-        for sentence in sentences:
-            if len(current_chunk + " " + sentence) < chunk_size:
-                current_chunk += " " + sentence if current_chunk else sentence
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence
+        # Sentences already in the translation memory or in the target language never go upstream
+        return ''.join(join_segments(iter_translate_detected(
+            self.memory, sentences, source_lang, target_lang, chunk_size, translate_chunks, report
+        ), separators))
+
+    @metrics.timed('translate_seconds', path='stream')
+    def stream_long_content(self, text, target_lang, source_lang='auto', chunk_size=700, report=None):
+        """Yield translated content piece by piece, in order, as soon as each is ready"""
+        if not text or not text.strip():
+            yield "No content to translate"
+            return
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if len(text) <= chunk_size:
+            yield self.translate_text(text, source_lang, target_lang, report)
+            return
         
-        # Show progress for long translations
-        if len(chunks) > 3:
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+        sentences, separators = segment_lines(text, chunk_size)
         
-        translated_chunks = []
+        def translate_chunks(chunks, source_lang):
+            translated = self.chunk_executor.imap(
+                lambda chunk: self.pool.translate(chunk, source_lang, target_lang),
+                chunks
+            )
+            try:
+                for _, translation, _ in translated:
+                    yield translation
+            finally:
+                translated.close()
         
-        for i, chunk in enumerate(chunks):
-            if chunk.strip():
-                if len(chunks) > 3:
-                    status_text.text(f"Translating chunk {i+1} of {len(chunks)}...")
-                
-                translated_chunk = self.translate_text(chunk, source_lang, target_lang)
-                translated_chunks.append(translated_chunk)
-                
-                if len(chunks) > 3:
-                    progress_bar.progress((i + 1) / len(chunks))
-                    time.sleep(0.3)  # Rate limiting
-        
-        if len(chunks) > 3:
-            progress_bar.empty()
-            status_text.empty()
-        
-        return ' '.join(translated_chunks)
-
-    def _smart_sentence_split(self, text):
-        """Intelligent sentence splitting"""
-        # Replace sentence endings with temporary markers
-        text = text.replace('. ', '.|SPLIT|')
-        text = text.replace('! ', '!|SPLIT|')
-        text = text.replace('? ', '?|SPLIT|')
-        text = text.replace('.\n', '.|SPLIT|')
-        text = text.replace('!\n', '!|SPLIT|')
-        text = text.replace('?\n', '?|SPLIT|')
-        
-        sentences = [s.strip() for s in text.split('|SPLIT|') if s.strip()]
-        return sentences
-
-    def _is_likely_english(self, text):
-        """Simple heuristic to detect if text is likely English"""
-        english_words = ['the', 'and', 'is', 'in', 'to', 'of', 'a', 'that', 'it', 'with', 'for', 'as', 'was', 'on', 'are']
-        words = text.lower().split()[:50]  # Check first 50 words
-        english_count = sum(1 for word in words if word in english_words)
-        return english_count > len(words) * 0.1  # If >10% are common English words
-
-    def extract_text_from_image(self, image):
+        # st.write_stream concatenates pieces as-is; join_segments gives each its separator
+        yield from join_segments(iter_translate_detected(
+            self.memory, sentences, source_lang, target_lang, chunk_size, translate_chunks, report
+        ), separators)
+
+    def extract_text_from_image(self, image, source_lang='auto'):
         """Extract text from uploaded image using OCR"""
         if not OCR_AVAILABLE:
             return "OCR functionality is not available. Please install pytesseract."
         
         try:
-            if hasattr(image, 'read'):
-                image = Image.open(image)
+            if hasattr(image, 'getvalue'):
+                image_bytes = image.getvalue()
+            elif hasattr(image, 'read'):
+                image_bytes = image.read()
+            elif hasattr(image, 'save'):
+                # A PIL image
+                buffer = io.BytesIO()
+                image.save(buffer, format='PNG')
+                image_bytes = buffer.getvalue()
+            else:
+                image_bytes = image
             
-            # Configure tesseract for better accuracy
-            custom_config = r'--oem 3 --psm 6'
-            extracted_text = pytesseract.image_to_string(image, config=custom_config)
-            return extracted_text.strip()
+            # Preprocessed, tiled and recognized in parallel; repeat uploads come from the cache
+            return self.ocr.extract_text(image_bytes, source_lang)
             
         except Exception as e:
             st.error(f"OCR Error: {str(e)}")
             return ""
 
+    def process_document_batch(self, files, target_lang, source_lang='auto'):
+        """OCR and translate every page of a batch, yielding each page's result in order"""
+        from batch_pipeline import iter_pages, run_pipeline
+
+        def translate(text):
+            # stream_long_content is used because translate_long_content draws progress widgets
+            report = TranslationReport()
+            translation = ''.join(self.stream_long_content(text, target_lang, source_lang, report=report))
+            return translation, report.failure_message() if report.failed else None
+
+        return run_pipeline(
+            iter_pages(files),
+            lambda image_bytes: self.ocr.extract_text(image_bytes, source_lang),
+            translate
+        )
+
     def fetch_wikipedia_article(self, title):
-        """Fetch Wikipedia article content"""
+        """Fetch a Wikipedia article's intro and section list; section bodies are fetched on demand"""
+        return self.fetch_wikipedia_articles([title]).get(title)
+
+    def fetch_wikipedia_articles(self, titles):
+        """Fetch several articles' outlines with batched lookups, keyed by the requested titles"""
         try:
-            url = "https://en.wikipedia.org/w/api.php"
-            params = {
-                "action": "query",
-                "prop": "extracts",
-                "explaintext": True,
-                "titles": title,
-                "format": "json",
-                "exintro": False,  # Get full article, not just intro
-                "exsectionformat": "plain"
-            }
-            
-            response = requests.get(url, params=params, timeout=15)
-            response.raise_for_status()
-            
-            data = response.json()
-            pages = data['query']['pages']
-            
-            if pages:
-                page = next(iter(pages.values()))
-                
-                if 'missing' in page:
-                    return None
-                
-                if 'extract' in page and page['extract']:
-                    # Limit content for better performance
-                    content = page['extract']
-                    if len(content) > 4000:
-                        content = content[:4000] + "... [Content truncated for translation]"
-                    
-                    return {
-                        'title': page.get('title', title),
-                        'content': content,
-                        'source': 'Wikipedia English',
-                        'url': f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"
-                    }
-            
-            return None
-            
+            return self.load_wikipedia_articles(titles)
         except Exception as e:
             st.error(f"Wikipedia fetch error: {str(e)}")
-            return None
+            return {}
+
+    @metrics.timed('wikipedia_fetch_seconds')
+    def load_wikipedia_articles(self, titles):
+        """Like fetch_wikipedia_articles, but raising on network errors"""
+        outlines = self.wikipedia.get_outlines(titles)
+        articles = {}
+        for title, outline in outlines.items():
+            if not outline or not (outline['intro'] or outline['sections']):
+                articles[title] = None
+                continue
+            articles[title] = {
+                'title': outline['title'],
+                'content': outline['intro'],
+                'sections': outline['sections'],
+                'revision': outline['revision'],
+                'source': 'Wikipedia English',
+                'url': f"https://en.wikipedia.org/wiki/{outline['title'].replace(' ', '_')}"
+            }
+        return articles
 
 # Initialize translator
 @st.cache_resource
@@ -217,7 +242,151 @@ def get_translator():
 
 translator = get_translator()
 
+class TranslationUnavailable(Exception):
+    """Raised out of cached_translation so failures aren't memoized"""
+
+@st.cache_data(ttl=WIKIPEDIA_TTL, max_entries=256, show_spinner=False)
+def cached_wikipedia_article(title):
+    """Article outline for a search term, memoized across reruns and sessions; errors are not cached"""
+    return translator.load_wikipedia_articles([title]).get(title)
+
+@st.cache_data(ttl=WIKIPEDIA_TTL, max_entries=512, show_spinner=False)
+def cached_wikipedia_section(title, index, revision):
+    return translator.wikipedia.get_section(title, index, revision)
+
+@st.cache_data(ttl=TRANSLATION_TTL, max_entries=1000, show_spinner=False)
+def cached_translation(text, source_lang, target_lang):
+    report = TranslationReport()
+    translation = translator.translate_text(text, source_lang, target_lang, report)
+    if report.failed:
+        raise TranslationUnavailable(translation)
+    return translation
+
+def result_key(kind, data, source_lang, target_lang):
+    """Session result key: what produced it, a hash of its input and the language pair"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return (kind, hashlib.sha256(data).hexdigest(), source_lang, target_lang)
+
+def stored_result(key):
+    return st.session_state.setdefault('results', {}).get(key)
+
+def store_result(key, value):
+    results = st.session_state.setdefault('results', {})
+    results.pop(key, None)
+    results[key] = value
+    while len(results) > RESULTS_KEPT:
+        results.pop(next(iter(results)))
+    return value
+
+def forget_result(key):
+    st.session_state.setdefault('results', {}).pop(key, None)
+
+def write_translation(key, text, target_lang, source_lang):
+    """Stream a translation onto the page; only complete ones are kept for reruns"""
+    report = TranslationReport()
+    translation = st.write_stream(translator.stream_long_content(text, target_lang, source_lang, report=report))
+    if report.failed:
+        st.warning(f"⚠ {report.failure_message()}")
+        forget_result(key)
+        return translation
+    return store_result(key, translation)
+
+def _series(name, **labels):
+    """Histogram series from the metrics snapshot matching all labels"""
+    return [
+        s for s in metrics.snapshot()['histograms'].get(name, [])
+        if all(s.get(k) == v for k, v in labels.items())
+    ]
+
+def render_diagnostics(trace=None):
+    """Sidebar panel with upstream rates plus cache, upstream, chunking and OCR metrics for this process"""
+    with st.sidebar.expander("📊 Diagnostics"):
+        st.markdown("**Upstream instances**")
+        st.table([
+            {
+                'Instance': h['url'].split('//')[-1].split('/')[0],
+                'State': h['state'],
+                'Rate (req/s)': h['rate_qps'],
+                'Paused (s)': h['paused_for'],
+                'Throttled': h['throttled']
+            }
+            for h in translator.pool.snapshot()
+        ])
+        if not metrics.ENABLED:
+            st.caption("Metrics are disabled (TRANSLATION_METRICS=0)")
+            return
+        stats = translator.memory.stats()
+        col1, col2 = st.columns(2)
+        col1.metric("Cache hit ratio", f"{stats['hit_ratio']:.0%}")
+        col2.metric("Cached entries", stats['entries'])
+        
+        snapshot = metrics.snapshot()
+        counters = {
+            name: sum(s['value'] for s in series) for name, series in snapshot['counters'].items()
+        }
+        errors = {
+            s['instance']: s['value'] for s in snapshot['counters'].get('upstream_requests_total', [])
+            if s['outcome'] == 'error'
+        }
+        rows = [
+            {
+                'Instance': s['instance'].split('//')[-1].split('/')[0],
+                'OK': s['count'],
+                'Errors': errors.get(s['instance'], 0),
+                'p50 (s)': s['p50'],
+                'p95 (s)': s['p95']
+            }
+            for s in _series('upstream_latency_seconds')
+        ]
+        if rows:
+            st.markdown("**Upstream latency**")
+            st.table(rows)
+        st.caption(
+            f"Failovers: {counters.get('failovers_total', 0)} · "
+            f"Hedged requests: {counters.get('hedged_requests_total', 0)} · "
+            f"Coalesced: {translator.pool.single_flight.stats()['shared']}"
+        )
+        
+        for label, name in (("Chunks per text", 'chunks_per_text'), ("Chunk size (chars)", 'chunk_chars'),
+                            ("OCR time (s)", 'ocr_seconds'), ("Wikipedia fetch (s)", 'wikipedia_fetch_seconds')):
+            for s in _series(name):
+                st.caption(f"{label}: n={s['count']}, p50≤{s['p50']}, p95≤{s['p95']}")
+        
+        if trace:
+            st.markdown("**This run**")
+            st.json(trace)
+
+def render_batch_page(page):
+    icon = '❌' if page['error'] else '⚠' if page.get('warning') else '✅'
+    with st.expander(f"{icon} {page['label']}"):
+        if page['error']:
+            st.error(page['error'])
+        elif not page['text']:
+            st.info("No readable text found on this page")
+        else:
+            st.markdown("**📝 Extracted Text**")
+            st.text(page['text'])
+            st.markdown("**🌐 Translation**")
+            if page.get('warning'):
+                st.warning(f"⚠ {page['warning']}")
+            st.markdown(page['translation'])
+
+def render_batch_summary(pages):
+    st.success(f"✅ Processed {len(pages)} page(s)")
+    partial = sum(1 for page in pages if page.get('warning'))
+    if partial:
+        st.warning(f"⚠ {partial} page(s) were only partly translated; untranslated sentences kept their original text")
+    st.download_button(
+        "📥 Download Combined Translation",
+        data=''.join(f"### {page['label']}\n\n{page['translation']}\n\n" for page in pages if page['translation']),
+        file_name="translation.txt",
+        mime="text/plain",
+        use_container_width=True
+    )
+
 def main():
+    metrics.start_trace()
     st.title("🌐 Universal Language Translator")
     st.markdown("*Translate text, images, and Wikipedia articles into 25+ languages including major Indic languages*")
     
@@ -230,10 +399,11 @@ def main():
             
             1. **Create `requirements.txt`** in your project root:
             ```
-            streamlit>=1.28.0
+            streamlit>=1.31.0
             requests>=2.25.1
             Pillow>=8.3.2
             pytesseract>=0.3.8
+            pypdfium2>=4.0.0
             urllib3>=1.26.0
             ```
             
@@ -312,25 +482,33 @@ def main():
         )
         
         col1, col2 = st.columns([2, 1])
+        text_key = result_key('text', text_input, source_lang, target_lang)
         
         with col1:
             if st.button("🔄 Translate Text", type="primary", use_container_width=True):
                 if text_input.strip():
-                    with st.spinner(f"Translating to {translator.languages[target_lang]}..."):
-                        translation = translator.translate_long_content(text_input, target_lang, source_lang)
-                    
-                    st.success("✅ Translation Complete!")
                     st.markdown("### 📄 Translated Text")
-                    st.markdown(translation)
+                    # Paragraphs appear as soon as they are translated
+                    translation = write_translation(text_key, text_input, target_lang, source_lang)
+                    
+                    if stored_result(text_key) is not None:
+                        st.success("✅ Translation Complete!")
                     
                     # Copy-friendly format
                     st.markdown("### 📋 Copy Text")
                     st.code(translation, language=None)
                 else:
                     st.warning("⚠ Please enter some text to translate")
+            elif text_input.strip() and stored_result(text_key) is not None:
+                # Same input and languages as last time: show the earlier result without translating again
+                st.markdown("### 📄 Translated Text")
+                st.markdown(stored_result(text_key))
+                st.markdown("### 📋 Copy Text")
+                st.code(stored_result(text_key), language=None)
         
         with col2:
             if st.button("🗑 Clear", use_container_width=True):
+                forget_result(text_key)
                 st.rerun()
 
     # Tab 2: Image Translation (only if OCR is available)
@@ -339,54 +517,102 @@ def main():
             st.header("🖼 Image Text Translation")
             st.markdown("Upload an image with text to extract and translate it")
             
-            uploaded_file = st.file_uploader(
-                "Choose an image file",
-                type=['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'],
-                help="Upload images containing text (documents, signs, screenshots, etc.)"
+            mode = st.radio(
+                "Mode",
+                ["Single image", "Batch (multi-page documents)"],
+                horizontal=True,
+                help="Batch mode handles several images, multi-page TIFFs and PDFs in one go"
             )
             
-            if uploaded_file is not None:
-                # Display image
-                col1, col2 = st.columns(2)
+            if mode == "Single image":
+                uploaded_file = st.file_uploader(
+                    "Choose an image file",
+                    type=['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'],
+                    help="Upload images containing text (documents, signs, screenshots, etc.)"
+                )
+            
+                if uploaded_file is not None:
+                    image_bytes = uploaded_file.getvalue()
+                    ocr_key = result_key('ocr', image_bytes, source_lang, None)
+                    image_key = result_key('image', image_bytes, source_lang, target_lang)
+                    
+                    # Display image
+                    col1, col2 = st.columns(2)
                 
-                with col1:
-                    st.markdown("#### 🖼 Uploaded Image")
-                    st.image(uploaded_file, caption="Your uploaded image", use_column_width=True)
+                    with col1:
+                        st.markdown("#### 🖼 Uploaded Image")
+                        st.image(uploaded_file, caption="Your uploaded image", use_column_width=True)
                 
-                with col2:
-                    st.markdown("#### 🔧 Actions")
-                    
-                    if st.button("🔍 Extract & Translate", type="primary", use_container_width=True):
-                        with st.spinner("🔍 Extracting text from image..."):
-                            extracted_text = translator.extract_text_from_image(uploaded_file)
+                    with col2:
+                        st.markdown("#### 🔧 Actions")
+                        extract_and_translate = st.button("🔍 Extract & Translate", type="primary", use_container_width=True)
+                        extract_only = st.button("📝 Extract Text Only", use_container_width=True)
                         
-                        if extracted_text:
-                            st.markdown("#### 📝 Extracted Text")
-                            st.text_area("", value=extracted_text, height=150, disabled=True)
-                            
-                            # Always translate unless target is English and text appears to be English
-                            with st.spinner(f"🔄 Translating to {translator.languages[target_lang]}..."):
-                                translation = translator.translate_long_content(extracted_text, target_lang, source_lang)
+                        extracted_text = stored_result(ocr_key)
+                        if (extract_and_translate or extract_only) and extracted_text is None:
+                            with st.spinner("🔍 Extracting text from image..."):
+                                extracted_text = translator.extract_text_from_image(uploaded_file, source_lang)
+                            if extracted_text:
+                                store_result(ocr_key, extracted_text)
+                        
+                        if extract_and_translate:
+                            if extracted_text:
+                                st.markdown("#### 📝 Extracted Text")
+                                st.text_area("", value=extracted_text, height=150, disabled=True)
                             
-                            st.markdown("#### 🌐 Translation")
-                            st.success(translation)
+                                st.markdown("#### 🌐 Translation")
+                                translation = write_translation(image_key, extracted_text, target_lang, source_lang)
                             
-                            # Copy format
-                            st.code(translation, language=None)
-                        else:
-                            st.error("❌ No readable text found in the image")
+                                # Copy format
+                                st.code(translation, language=None)
+                            else:
+                                st.error("❌ No readable text found in the image")
+                        elif extract_only:
+                            if extracted_text:
+                                st.markdown("#### 📝 Extracted Text")
+                                st.text_area("", value=extracted_text, height=200, disabled=True)
+                            else:
+                                st.error("❌ No readable text found in the image")
+                        elif extracted_text:
+                            # Earlier results for this image survive other widget changes
+                            st.markdown("#### 📝 Extracted Text")
+                            st.text_area("", value=extracted_text, height=150, disabled=True)
+                            if stored_result(image_key) is not None:
+                                st.markdown("#### 🌐 Translation")
+                                st.markdown(stored_result(image_key))
+                                st.code(stored_result(image_key), language=None)
+            else:
+                batch_files = st.file_uploader(
+                    "Choose scanned pages, multi-page TIFFs or PDFs",
+                    type=['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'tif', 'tiff', 'pdf'],
+                    accept_multiple_files=True,
+                    help="Pages are OCR'd and translated in a pipeline, one page at a time"
+                )
+                
+                if batch_files:
+                    digest = hashlib.sha256()
+                    for file in batch_files:
+                        digest.update(file.name.encode('utf-8'))
+                        digest.update(file.getvalue())
+                    batch_key = result_key('batch', digest.hexdigest(), source_lang, target_lang)
                     
-                    if st.button("📝 Extract Text Only", use_container_width=True):
-                        with st.spinner("🔍 Extracting text..."):
-                            extracted_text = translator.extract_text_from_image(uploaded_file)
+                    if st.button("📚 Extract & Translate All", type="primary", use_container_width=True):
+                        status_text = st.empty()
+                        pages = []
                         
-                        if extracted_text:
-                            st.markdown("#### 📝 Extracted Text")
-                            st.text_area("", value=extracted_text, height=200, disabled=True)
-                        else:
-                            st.error("❌ No readable text found in the image")
+                        for page in translator.process_document_batch(batch_files, target_lang, source_lang):
+                            # Only the text is kept; page images are dropped as soon as they are OCR'd
+                            pages.append({k: page[k] for k in ('label', 'text', 'translation', 'warning', 'error')})
+                            status_text.text(f"Processed {len(pages)} page(s) - latest: {page['label']}")
+                            render_batch_page(page)
+                        
+                        status_text.empty()
+                        render_batch_summary(store_result(batch_key, pages))
+                    elif stored_result(batch_key) is not None:
+                        for page in stored_result(batch_key):
+                            render_batch_page(page)
+                        render_batch_summary(stored_result(batch_key))
 
-    # Tab 3: Wikipedia Translation
     with tab3:
         st.header("📚 Wikipedia Article Translation")
         st.markdown("Search Wikipedia articles and translate them into any language")
@@ -400,51 +626,79 @@ def main():
         col1, col2 = st.columns([3, 1])
         
         with col1:
-            if st.button("🔍 Search & Translate", type="primary", use_container_width=True):
-                if search_term.strip():
-                    with st.spinner("🔍 Searching Wikipedia..."):
-                        article = translator.fetch_wikipedia_article(search_term)
-                    
-                    if article:
-                        st.success(f"✅ Found article: *{article['title']}*")
-                        st.markdown(f"📖 Source: [{article['source']}]({article['url']})")
-                        
-                        # Show original article in expander
-                        with st.expander("📄 Original Article (English)", expanded=False):
-                            st.markdown(article['content'])
-                        
-                        # Always translate the Wikipedia content
-                        st.markdown(f"### 🌐 Article in {translator.languages[target_lang]}")
-                        
-                        with st.spinner(f"🔄 Translating article to {translator.languages[target_lang]}..."):
-                            translated_content = translator.translate_long_content(
-                                article['content'], 
-                                target_lang, 
-                                'en'  # Wikipedia content is in English
-                            )
-                        
-                        st.markdown("#### 📖 Translated Article")
-                        st.markdown(translated_content)
-                        
-                        # Copy format
-                        with st.expander("📋 Copy Translated Text"):
-                            st.code(translated_content, language=None)
-                            
-                    else:
-                        st.error(f"❌ No Wikipedia article found for '{search_term}'. Try a different search term.")
-                else:
-                    st.warning("⚠ Please enter a search term")
+            search_and_translate = st.button("🔍 Search & Translate", type="primary", use_container_width=True)
         
         with col2:
-            if st.button("🔍 Search Only", use_container_width=True):
-                if search_term.strip():
-                    with st.spinner("🔍 Searching..."):
-                        article = translator.fetch_wikipedia_article(search_term)
-                    
-                    if article:
-                        st.success(f"✅ Found: *{article['title']}*")
-                        st.markdown(article['content'][:500] + "...")
-                        st.markdown(f"[Read full article]({article['url']})")
+            search_only = st.button("🔍 Search Only", use_container_width=True)
+        
+        if search_and_translate or search_only:
+            if search_term.strip():
+                with st.spinner("🔍 Searching Wikipedia..."):
+                    try:
+                        article = cached_wikipedia_article(search_term)
+                    except Exception as e:
+                        st.error(f"Wikipedia fetch error: {str(e)}")
+                        article = None
+                
+                # Kept in session state so expanding a section later doesn't lose the article
+                st.session_state['wiki_article'] = article
+                st.session_state['wiki_translate'] = search_and_translate
+                if not article:
+                    st.error(f"❌ No Wikipedia article found for '{search_term}'. Try a different search term.")
+            else:
+                st.warning("⚠ Please enter a search term")
+        
+        article = st.session_state.get('wiki_article')
+        if article:
+            translate_article = st.session_state.get('wiki_translate', True)
+            st.success(f"✅ Found article: *{article['title']}*")
+            st.markdown(f"📖 Source: [{article['source']}]({article['url']})")
+            
+            if translate_article:
+                # Show original intro in expander
+                with st.expander("📄 Original Introduction (English)", expanded=False):
+                    st.markdown(article['content'])
+                
+                # The intro is translated right away; other sections only when opened
+                st.markdown(f"### 🌐 Article in {translator.languages[target_lang]}")
+                
+                st.markdown("#### 📖 Translated Introduction")
+                intro_key = result_key('wiki', article['content'], 'en', target_lang)
+                translated_content = stored_result(intro_key)
+                if translated_content is None:
+                    # Wikipedia content is in English
+                    translated_content = write_translation(intro_key, article['content'], target_lang, 'en')
+                else:
+                    st.markdown(translated_content)
+                
+                # Copy format
+                with st.expander("📋 Copy Translated Text"):
+                    st.code(translated_content, language=None)
+            else:
+                st.markdown(article['content'][:500] + "...")
+                st.markdown(f"[Read full article]({article['url']})")
+            
+            if article['sections']:
+                st.markdown("#### 📑 Sections")
+                for section in article['sections']:
+                    indent = " " * (section['level'] - 2)
+                    with st.expander(f"{indent}{section['number']} {section['title']}"):
+                        label = "🌐 Load & translate section" if translate_article else "📄 Load section"
+                        if st.checkbox(label, key=f"wiki_section_{article['title']}_{section['index']}"):
+                            try:
+                                section_text = cached_wikipedia_section(article['title'], section['index'], article.get('revision'))
+                            except Exception as e:
+                                st.error(f"Wikipedia fetch error: {str(e)}")
+                                section_text = ""
+                            section_key = result_key('wiki', section_text, 'en', target_lang)
+                            if not section_text:
+                                st.info("This section has no readable text of its own; see its subsections.")
+                            elif not translate_article:
+                                st.markdown(section_text)
+                            elif stored_result(section_key) is not None:
+                                st.markdown(stored_result(section_key))
+                            else:
+                                write_translation(section_key, section_text, target_lang, 'en')
 
     # Tab 4: Quick Translation
     with tab4:
@@ -457,23 +711,32 @@ def main():
             help="Perfect for quick translations of short texts"
         )
         
-        if st.button("⚡ Quick Translate", type="primary", use_container_width=True):
-            if quick_text.strip():
+        quick_key = result_key('quick', quick_text, source_lang, target_lang)
+        clicked = st.button("⚡ Quick Translate", type="primary", use_container_width=True)
+        if clicked and not quick_text.strip():
+            st.warning("⚠ Please enter some text to translate")
+        elif clicked or (quick_text.strip() and stored_result(quick_key) is not None):
+            if clicked:
+                # Memoized across sessions; failures aren't, so clicking again retries them
                 with st.spinner("⚡ Translating..."):
-                    translation = translator.translate_text(quick_text, source_lang, target_lang)
-                
-                # Side by side display
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown("#### 📥 Original")
-                    st.info(quick_text)
-                
-                with col2:
-                    st.markdown(f"#### 📤 {translator.languages[target_lang]}")
-                    st.success(translation)
+                    try:
+                        translation = cached_translation(quick_text, source_lang, target_lang)
+                    except TranslationUnavailable as e:
+                        translation = str(e)
+                store_result(quick_key, translation)
             else:
-                st.warning("⚠ Please enter some text to translate")
+                translation = stored_result(quick_key)
+            
+            # Side by side display
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.markdown("#### 📥 Original")
+                st.info(quick_text)
+            
+            with col2:
+                st.markdown(f"#### 📤 {translator.languages[target_lang]}")
+                st.success(translation)
 
     # Footer
     st.markdown("---")
@@ -486,6 +749,8 @@ def main():
     
     st.markdown(f"**{footer_text}**")
     st.markdown("*Bridging language barriers with AI-powered translation*")
+    
+    render_diagnostics(metrics.end_trace())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,562 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, web
+
+import metrics
+from api_common import languages_payload, search_article_mock
+from job_queue import FINISHED, AsyncJobQueue, JobStore, PieceFailed
+from language_id import language_runs, source_language
+from lingva_pool import (
+    DEFAULT_INSTANCES, MAX_CHUNK_CHARS, THROTTLE_STATUSES, InstancePool, UpstreamThrottled, parse_retry_after,
+    upstream_outcome
+)
+from segmentation import join_segments, pack_sentences, segment_lines
+from single_flight import AsyncSingleFlight
+from translation_memory import TranslationMemory, TranslationReport, apply_group_translation, normalize_text
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+
+REQUEST_DEADLINE = float(os.environ.get('TRANSLATION_REQUEST_DEADLINE', 30))
+SHUTTING_DOWN = web.AppKey('shutting_down', asyncio.Event)
+
+
+class AsyncArticleTranslator:
+    """asyncio counterpart of ArticleTranslator backed by one pooled aiohttp session"""
+
+    def __init__(self, max_connections=200, max_concurrency=8, instance_qps=2.0, hedge=False, timeout=15):
+        self.lingva_instances = list(DEFAULT_INSTANCES)
+        # Only the pool's health, circuit breaker and rate-limit bookkeeping is used; requests go through aiohttp
+        self.pool = InstancePool(self.lingva_instances, instance_qps=instance_qps, timeout=timeout)
+        self.memory = TranslationMemory()
+        self.single_flight = AsyncSingleFlight()
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.hedge = hedge
+        self.timeout = timeout
+        self.session = None
+
+    async def start(self):
+        connector = TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=max(1, self.max_connections // len(self.pool.instances)),
+            keepalive_timeout=30,
+            ttl_dns_cache=300
+        )
+        self.session = ClientSession(connector=connector, timeout=ClientTimeout(total=self.timeout, connect=5))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _select(self, exclude, block=True):
+        while True:
+            idx = self.pool.select(exclude, block=False)
+            if idx is not None or not block or not self.pool.has_available(exclude):
+                return idx
+            # Every candidate is at its rate limit or paused after throttling
+            await asyncio.sleep(0.05)
+
+    async def _send(self, idx, text, source_lang, target_lang):
+        url = self.pool.url_for(idx, text, source_lang, target_lang)
+        start = time.perf_counter()
+        status = None
+        try:
+            async with self.session.get(url) as response:
+                status = response.status
+                if status in THROTTLE_STATUSES:
+                    raise UpstreamThrottled(status, parse_retry_after(response.headers.get('Retry-After')))
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+            translation = (data.get('translation') or '').strip()
+            if not translation:
+                raise ValueError("empty translation")
+        except asyncio.CancelledError:
+            self.pool.release(idx)
+            raise
+        except Exception as e:
+            self.pool.record(idx, error=e, status=status)
+            metrics.inc('upstream_requests_total', instance=self.pool.instances[idx].url, outcome=upstream_outcome(e))
+            metrics.trace_count('upstream_errors')
+            raise
+        latency = time.perf_counter() - start
+        self.pool.record(idx, latency=latency)
+        metrics.inc('upstream_requests_total', instance=self.pool.instances[idx].url, outcome='ok')
+        metrics.observe('upstream_latency_seconds', latency, instance=self.pool.instances[idx].url)
+        metrics.trace_count('upstream_calls')
+        return translation
+
+    async def translate(self, text, source_lang='auto', target_lang='en'):
+        """Translate one chunk with failover and optional hedging. Returns None if every instance fails.
+
+        Concurrent requests for the same chunk share one upstream call.
+        """
+        return await self.single_flight.do(
+            (source_lang, target_lang, text.strip()),
+            lambda: self._translate(text, source_lang, target_lang)
+        )
+
+    async def _translate(self, text, source_lang, target_lang):
+        tried = set()
+        started = time.monotonic()
+        retries = 0
+        while True:
+            idx = await self._select(tried)
+            if idx is None:
+                throttled = self.pool.throttled_since(tried, started)
+                if not throttled or retries >= self.pool.throttle_retries:
+                    return None
+                retries += 1
+                tried -= throttled
+                continue
+            if tried:
+                metrics.inc('failovers_total')
+                metrics.trace_count('failovers')
+            tried.add(idx)
+
+            tasks = [asyncio.ensure_future(self._send(idx, text, source_lang, target_lang))]
+            try:
+                if self.hedge:
+                    done, _ = await asyncio.wait(tasks, timeout=self.pool.hedge_delay(idx))
+                    if not done:
+                        backup = await self._select(tried, block=False)
+                        if backup is not None:
+                            tried.add(backup)
+                            logging.info(f"Hedging slow request to {self.pool.instances[backup].url}")
+                            metrics.inc('hedged_requests_total')
+                            tasks.append(asyncio.ensure_future(self._send(backup, text, source_lang, target_lang)))
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            return task.result()
+                        logging.warning(f"Translation request failed: {task.exception()}")
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    @metrics.timed('translate_seconds', path='text')
+    async def translate_text(self, text, source_lang='auto', target_lang='en', report=None):
+        if not text or not text.strip():
+            return "No text to translate"
+
+        if len(text) > MAX_CHUNK_CHARS:
+            return await self.translate_long_text(text, target_lang, source_lang, report=report)
+
+        if report is None:
+            report = TranslationReport()
+        report.sentences += 1
+        source_lang = source_language(text, source_lang)
+        if source_lang == target_lang:
+            report.unchanged += 1
+            return text
+
+        # The memory's disk tier is SQLite, so it is only used off the event loop
+        cached = await asyncio.to_thread(self.memory.get, text, source_lang, target_lang)
+        if cached is not None:
+            return cached
+
+        translation = await self.translate(text, source_lang, target_lang)
+        if translation:
+            await asyncio.to_thread(self.memory.put, text, source_lang, target_lang, translation)
+            return translation
+
+        report.failed += 1
+        return f"Translation failed - using original text: {text[:200]}..."
+
+    @metrics.timed('translate_seconds', path='long')
+    async def translate_long_text(self, text, target_lang, source_lang='auto', chunk_size=800, report=None):
+        """Translate text of any length; failed sentences are counted in `report`"""
+        if not text or not text.strip():
+            return "No content to translate"
+
+        if len(text) <= chunk_size:
+            return await self.translate_text(text, source_lang, target_lang, report)
+
+        if report is None:
+            report = TranslationReport()
+
+        sentences, separators = segment_lines(text, chunk_size)
+        sentences = [normalize_text(s) for s in sentences]
+        runs = list(language_runs(sentences, source_lang))
+
+        def lookup():
+            # Runs already in the target language are kept; the rest are looked up under their detected source
+            return [
+                sentence if lang == target_lang else self.memory.get(sentence, lang, target_lang)
+                for lang, run in runs
+                for sentence in run
+            ]
+
+        results = await asyncio.to_thread(lookup)
+        jobs = []
+        start = 0
+        for lang, run in runs:
+            if lang == target_lang:
+                report.unchanged += len(run)
+            missing = [(i, s) for i, s in enumerate(run, start) if results[i] is None]
+            jobs.extend((lang, group) for group in pack_sentences(missing, chunk_size))
+            start += len(run)
+        report.sentences += len(sentences)
+        metrics.trace_count('cache_hits', sum(1 for r in results if r is not None))
+        metrics.observe_chunks(['\n'.join(s for _, s in group) for _, group in jobs])
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_job(lang, group):
+            async with semaphore:
+                return await self.translate('\n'.join(s for _, s in group), lang, target_lang)
+
+        translations = await asyncio.gather(*(run_job(lang, group) for lang, group in jobs))
+
+        def store():
+            for (lang, group), translation in zip(jobs, translations):
+                apply_group_translation(self.memory, group, translation, results, lang, target_lang, report)
+
+        await asyncio.to_thread(store)
+        return ''.join(join_segments([results], separators))
+
+
+# Initialize the translator
+translator = AsyncArticleTranslator(
+    max_connections=int(os.environ.get('TRANSLATION_MAX_CONNECTIONS', 200)),
+    max_concurrency=int(os.environ.get('TRANSLATION_MAX_CONCURRENCY', 8)),
+    instance_qps=float(os.environ.get('LINGVA_INSTANCE_QPS', 2.0)),
+    hedge=os.environ.get('LINGVA_HEDGE', '0') == '1'
+)
+
+async def translate_job_piece(text, source_lang, target_lang):
+    """Translate a job piece through the same long-text path as synchronous /translate requests"""
+    report = TranslationReport()
+    translation = await translator.translate_long_text(text, target_lang, source_lang, report=report)
+    if report.failed:
+        # Raising keeps the fallback text out of the job, which is retried from this piece
+        raise PieceFailed(report.failure_message())
+    return translation
+
+
+job_queue = AsyncJobQueue(
+    JobStore(),
+    translate_job_piece,
+    interactive_workers=int(os.environ.get('TRANSLATION_INTERACTIVE_WORKERS', 2)),
+    bulk_workers=int(os.environ.get('TRANSLATION_JOB_WORKERS', 2))
+)
+
+routes = web.RouteTableDef()
+
+
+def with_deadline(handler):
+    """Cancel the handler and answer 504 once the request deadline passes.
+
+    Clients may shorten (never extend) the deadline with an X-Request-Timeout header in seconds.
+    """
+    async def wrapped(request):
+        deadline = REQUEST_DEADLINE
+        try:
+            deadline = min(deadline, float(request.headers.get('X-Request-Timeout', deadline)))
+        except ValueError:
+            pass
+        try:
+            return await asyncio.wait_for(handler(request), deadline)
+        except asyncio.TimeoutError:
+            logging.warning(f"Deadline of {deadline}s exceeded for {request.path}")
+            return web.json_response({'error': 'Request deadline exceeded'}, status=504)
+    return wrapped
+
+
+@web.middleware
+async def trace_middleware(request, handler):
+    metrics.start_trace(request.headers.get('X-Request-ID'))
+    response = await handler(request)
+    summary = metrics.end_trace()
+    if summary:
+        # Streamed responses have already sent their headers
+        if not response.prepared:
+            response.headers['X-Request-ID'] = summary['trace_id']
+        logging.info(f"trace {summary['trace_id']} {request.method} {request.path} {response.status}: {summary}")
+    return response
+
+
+@web.middleware
+async def shutdown_middleware(request, handler):
+    # Requests arriving on kept-alive connections after shutdown began are turned away
+    if request.app[SHUTTING_DOWN].is_set() and request.method != 'OPTIONS':
+        return web.json_response({'error': 'Server is shutting down'}, status=503, headers={'Retry-After': '5'})
+    return await handler(request)
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    if request.method == 'OPTIONS':
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-Request-Timeout, X-Request-ID'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, DELETE, OPTIONS'
+    return response
+
+
+async def submit_job(text, source_lang, target_lang, data, meta=None):
+    """Queue text for background translation and answer 202 with where to follow it"""
+    job, created = await job_queue.submit(text, source_lang, target_lang, data.get('priority'), meta)
+    return web.json_response({
+        'success': True,
+        'job_id': job['id'],
+        'status': job['status'],
+        'priority': job['lane'],
+        'created': created,
+        'status_url': f"/jobs/{job['id']}",
+        'events_url': f"/jobs/{job['id']}/events"
+    }, status=202)
+
+
+@routes.post('/search')
+@with_deadline
+async def search_article(request):
+    try:
+        data = await request.json()
+        keyword = data.get('keyword', '').strip()
+        if not keyword:
+            return web.json_response({'error': 'No keyword provided'}, status=400)
+        article_result = search_article_mock(keyword)
+        return web.json_response(article_result)
+    except Exception as e:
+        logging.error(f"Search error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+
+
+@routes.post('/translate')
+@with_deadline
+async def translate_text_endpoint(request):
+    try:
+        data = await request.json()
+        text = data.get('text', '').strip()
+        source_lang = data.get('source_lang', 'auto')
+        target_lang = data.get('target_lang', 'en')
+        if not text:
+            return web.json_response({'error': 'No text provided'}, status=400)
+        if data.get('async'):
+            return await submit_job(text, source_lang, target_lang, data)
+        report = TranslationReport()
+        translated_text = await translator.translate_long_text(text, target_lang, source_lang, report=report)
+        result = {
+            'success': True,
+            'original_text': text,
+            'translated_text': translated_text,
+            'source_language': source_lang,
+            'target_language': target_lang
+        }
+        if report.failed:
+            result['failed_sentences'] = report.failed
+            result['warning'] = report.failure_message()
+        elif report.all_unchanged:
+            result['note'] = 'No translation needed'
+        return web.json_response(result)
+    except Exception as e:
+        logging.error(f"Translation error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+
+
+@routes.post('/search-and-translate')
+@with_deadline
+async def search_and_translate(request):
+    try:
+        data = await request.json()
+        keyword = data.get('keyword', '').strip()
+        target_lang = data.get('target_language', 'en')
+        if not keyword:
+            return web.json_response({'error': 'No keyword provided'}, status=400)
+        article_result = search_article_mock(keyword)
+        article_content = article_result.get('content', '')
+        if data.get('async'):
+            return await submit_job(article_content, 'auto', target_lang, data, {
+                'keyword': keyword,
+                'original_article': article_result
+            })
+        report = TranslationReport()
+        translated_content = await translator.translate_long_text(article_content, target_lang, report=report)
+        result = {
+            'success': True,
+            'keyword': keyword,
+            'target_language': target_lang,
+            'original_article': article_result,
+            'original_content': article_content,
+            'translated_content': translated_content
+        }
+        if report.failed:
+            result['failed_sentences'] = report.failed
+            result['warning'] = report.failure_message()
+        return web.json_response(result)
+    except Exception as e:
+        logging.error(f"Search and translate error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+
+
+@routes.post('/jobs')
+async def create_job(request):
+    try:
+        data = await request.json()
+        text = data.get('text', '').strip()
+        if not text:
+            return web.json_response({'error': 'No text provided'}, status=400)
+        return await submit_job(text, data.get('source_lang', 'auto'), data.get('target_lang', 'en'), data)
+    except Exception as e:
+        logging.error(f"Job submit error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+
+
+def since_param(request):
+    try:
+        return int(request.query.get('since', 0))
+    except ValueError:
+        return 0
+
+
+@routes.get('/jobs/{job_id}')
+async def job_status(request):
+    status = await asyncio.to_thread(job_queue.store.status, request.match_info['job_id'], since_param(request))
+    if status is None:
+        return web.json_response({'error': 'Job not found'}, status=404)
+    return web.json_response(dict(status, success=True))
+
+
+@routes.get('/jobs/{job_id}/events')
+async def job_status_events(request):
+    """Stream a start event, one event per finished piece, then the job's final status (NDJSON, or SSE on request)"""
+    job_id = request.match_info['job_id']
+    since = since_param(request)
+    status = await asyncio.to_thread(job_queue.store.status, job_id, since)
+    if status is None:
+        return web.json_response({'error': 'Job not found'}, status=404)
+    sse = request.query.get('stream') == 'sse' or 'text/event-stream' in request.headers.get('Accept', '')
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream' if sse else 'application/x-ndjson',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+
+    async def send(event):
+        if sse:
+            line = f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        else:
+            line = json.dumps(event, ensure_ascii=False) + '\n'
+        await response.write(line.encode('utf-8'))
+
+    await send(dict({k: v for k, v in status.items() if k not in ('pieces', 'translated_text')}, event='start'))
+    while True:
+        for piece in status['pieces']:
+            await send(dict(piece, event='chunk'))
+            since = piece['index'] + 1
+        if status['status'] in FINISHED:
+            break
+        await asyncio.sleep(0.25)
+        status = await asyncio.to_thread(job_queue.store.status, job_id, since)
+    final = {'event': status['status'], 'job_id': job_id, 'progress': status['progress']}
+    if status.get('error'):
+        final['error'] = status['error']
+    await send(final)
+    await response.write_eof()
+    return response
+
+
+@routes.delete('/jobs/{job_id}')
+async def cancel_job(request):
+    job_id = request.match_info['job_id']
+    if not await asyncio.to_thread(job_queue.store.cancel, job_id):
+        return web.json_response({'error': 'Job not found or already finished'}, status=404)
+    return web.json_response({'success': True, 'job_id': job_id, 'status': 'cancelled'})
+
+
+@routes.get('/languages')
+async def get_supported_languages(request):
+    return web.json_response(languages_payload())
+
+
+@routes.post('/translate-sentence')
+@with_deadline
+async def translate_sentence(request):
+    try:
+        data = await request.json()
+        sentence = data.get('sentence', '').strip()
+        target_lang = data.get('language', 'hi')
+        if not sentence:
+            return web.json_response({'error': 'No sentence provided'}, status=400)
+        translated_sentence = await translator.translate_text(sentence, 'auto', target_lang)
+        return web.json_response({
+            'success': True,
+            'original_sentence': sentence,
+            'translated_sentence': translated_sentence,
+            'target_language': target_lang
+        })
+    except Exception as e:
+        logging.error(f"Sentence translation error: {e}")
+        return web.json_response({'error': str(e)}, status=500)
+
+
+@routes.get('/instances')
+async def instance_health(request):
+    return web.json_response({
+        'success': True,
+        'instances': translator.pool.snapshot(),
+        'coalescing': translator.single_flight.stats()
+    })
+
+
+@routes.get('/metrics')
+async def metrics_endpoint(request):
+    stats = translator.memory.stats()
+    gauges = {
+        'memory_hit_ratio': ("Translation memory hit ratio since start", stats['hit_ratio']),
+        'memory_entries': ("Entries in the in-process translation memory", stats['entries']),
+        'coalesced_requests': ("Chunk requests served by an identical in-flight call", translator.single_flight.stats()['shared']),
+        'open_circuits': ("Lingva instances currently taken out of rotation", sum(1 for h in translator.pool.snapshot() if h['state'] == 'open'))
+    }
+    for lane, counts in (await asyncio.to_thread(job_queue.store.counts)).items():
+        gauges[f'jobs_queued_{lane}'] = (f"Jobs waiting in the {lane} lane", counts.get('queued', 0))
+    return web.Response(text=metrics.render_prometheus(gauges), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+
+async def on_startup(app):
+    await translator.start()
+    await job_queue.start()
+
+
+async def on_shutdown(app):
+    # By now the server has stopped listening; once this returns, run_app waits for in-flight requests
+    app[SHUTTING_DOWN].set()
+    logging.info("Shutting down: finishing in-flight job pieces and requests...")
+    await job_queue.drain(REQUEST_DEADLINE)
+
+
+async def on_cleanup(app):
+    await job_queue.close()
+    await translator.close()
+
+
+def create_app():
+    app = web.Application(middlewares=[cors_middleware, shutdown_middleware, trace_middleware])
+    app[SHUTTING_DOWN] = asyncio.Event()
+    app.add_routes(routes)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == '__main__':
+    logging.info("Starting async Translation API Server...")
+    # run_app stops accepting on SIGINT/SIGTERM and gives in-flight requests up to the deadline to finish
+    web.run_app(
+        create_app(),
+        host='0.0.0.0',
+        port=int(os.environ.get('PORT', 5000)),
+        shutdown_timeout=REQUEST_DEADLINE
+    )
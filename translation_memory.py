@@ -0,0 +1,220 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from language_id import language_runs
+from segmentation import pack_sentences
+
+DEFAULT_DB_PATH = os.environ.get('TRANSLATION_MEMORY_PATH', 'translation_memory.sqlite3')
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different inputs share a cache entry"""
+    return ' '.join(text.split())
+
+
+class TranslationMemory:
+    """Two-tier translation cache: in-process LRU backed by a shared SQLite store"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_entries=5000, ttl=3600, disk_ttl=30 * 24 * 3600):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_ttl = disk_ttl
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'writes': 0}
+        if self.db_path:
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " source TEXT NOT NULL, target TEXT NOT NULL, text TEXT NOT NULL,"
+                " translation TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (source, target, text))"
+            )
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _remember(self, key, translation):
+        with self._lock:
+            self._lru[key] = (translation, time.monotonic() + self.ttl)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def get(self, text, source_lang, target_lang):
+        """Return a cached translation or None"""
+        key = (source_lang, target_lang, normalize_text(text))
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._lru.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return entry[0]
+                del self._lru[key]
+                self.counters['expired'] += 1
+
+        if self.db_path:
+            try:
+                row = self._connection().execute(
+                    "SELECT translation, created FROM translations WHERE source=? AND target=? AND text=?",
+                    key
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row and time.time() - row[1] < self.disk_ttl:
+                self._remember(key, row[0])
+                self._count('disk_hits')
+                return row[0]
+
+        self._count('misses')
+        return None
+
+    def put(self, text, source_lang, target_lang, translation):
+        """Store a successful translation in both tiers"""
+        key = (source_lang, target_lang, normalize_text(text))
+        self._remember(key, translation)
+        if self.db_path:
+            try:
+                self._connection().execute(
+                    "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                    key + (translation, time.time())
+                )
+                self._count('writes')
+            except sqlite3.Error:
+                pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self._lru)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+class TranslationReport:
+    """Tally of how the sentences of one text were handled"""
+
+    def __init__(self):
+        self.sentences = 0
+        self.unchanged = 0
+        self.failed = 0
+        # Translated, but not stored per sentence because upstream merged or split lines
+        self.uncached = 0
+
+    @property
+    def all_unchanged(self):
+        """True when every sentence was already in the target language"""
+        return self.sentences > 0 and self.unchanged == self.sentences
+
+    def failure_message(self):
+        if not self.failed:
+            return None
+        return f"Translation failed for {self.failed} of {self.sentences} sentences - using original text"
+
+
+def apply_group_translation(memory, group, translation, results, source_lang, target_lang, report=None):
+    """Spread a packed chunk's translation back over its sentences and cache each line.
+
+    Returns False when the chunk failed and its sentences fell back to the
+    original text; failed and uncached sentences are counted in `report`.
+    """
+    if translation is None:
+        for index, sentence in group:
+            results[index] = sentence
+        if report is not None:
+            report.failed += len(group)
+        return False
+    lines = [line.strip() for line in translation.split('\n') if line.strip()]
+    if len(lines) == len(group):
+        for (index, sentence), line in zip(group, lines):
+            results[index] = line
+            memory.put(sentence, source_lang, target_lang, line)
+    else:
+        # Upstream merged or split lines; keep the chunk but don't cache it per sentence
+        results[group[0][0]] = ' '.join(lines)
+        for index, _ in group[1:]:
+            results[index] = ''
+        if report is not None:
+            report.uncached += len(group)
+    return True
+
+
+def iter_translate_with_memory(memory, sentences, source_lang, target_lang, chunk_size, translate_chunks,
+                               report=None):
+    """Translate sentences, sending only the ones missing from memory upstream.
+
+    Missing sentences are packed one per line so each translated line can be
+    stored under its own sentence. `translate_chunks` takes a list of chunk
+    texts and returns or yields their translations in order (None for
+    failures); failed sentences fall back to the original text and are
+    counted in `report`, a TranslationReport, when one is given. Yields lists
+    of translated sentences in order, each as soon as it is ready.
+    """
+    sentences = [normalize_text(s) for s in sentences]
+    results = [memory.get(s, source_lang, target_lang) for s in sentences]
+
+    missing = [(i, s) for i, s in enumerate(sentences) if results[i] is None]
+    groups = pack_sentences(missing, chunk_size)
+    chunks = ['\n'.join(s for _, s in group) for group in groups]
+    metrics.trace_count('cache_hits', len(sentences) - len(missing))
+    metrics.observe_chunks(chunks)
+    emitted = 0
+    if report is not None:
+        report.sentences += len(sentences)
+
+    translations = translate_chunks(chunks) if groups else []
+    try:
+        for group, translation in zip(groups, translations):
+            apply_group_translation(memory, group, translation, results, source_lang, target_lang, report)
+            # Groups are packed in sentence order, so everything up to this group's last sentence is ready
+            end = group[-1][0] + 1
+            yield results[emitted:end]
+            emitted = end
+    finally:
+        if hasattr(translations, 'close'):
+            translations.close()
+
+    if emitted < len(results):
+        yield results[emitted:]
+
+
+def iter_translate_detected(memory, sentences, source_lang, target_lang, chunk_size, translate_chunks,
+                            report=None):
+    """Like iter_translate_with_memory, but one language run at a time.
+
+    With source 'auto' the sentences are grouped by detected language (see
+    language_id.language_runs). Runs already in the target language are
+    passed through without an upstream call; the rest are sent, and cached,
+    under their detected source. `translate_chunks` takes (chunks, source_lang).
+    """
+    for lang, run in language_runs(sentences, source_lang):
+        if lang == target_lang:
+            if report is not None:
+                report.sentences += len(run)
+                report.unchanged += len(run)
+            yield [normalize_text(s) for s in run]
+            continue
+        yield from iter_translate_with_memory(
+            memory, run, lang, target_lang, chunk_size,
+            lambda chunks, lang=lang: translate_chunks(chunks, lang),
+            report
+        )
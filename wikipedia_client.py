@@ -0,0 +1,367 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from html.parser import HTMLParser
+
+import requests
+
+import metrics
+
+API_URL = os.environ.get('WIKIPEDIA_API_URL', "https://en.wikipedia.org/w/api.php")
+DEFAULT_CACHE_PATH = os.environ.get('WIKIPEDIA_CACHE_PATH', 'wikipedia_cache.sqlite3')
+USER_AGENT = "wikitranslate/1.0 (Wikipedia translation app; python-requests)"
+
+# MediaWiki accepts at most 50 titles per query and 20 intro extracts per request
+MAX_TITLES_PER_QUERY = 50
+MAX_EXTRACTS_PER_QUERY = 20
+
+# Sections that are lists of links or citations rather than prose
+SKIPPED_SECTIONS = {
+    'references', 'external links', 'see also', 'notes', 'further reading',
+    'bibliography', 'sources', 'citations', 'footnotes', 'notes and references'
+}
+
+_SKIPPED_TAGS = {'table', 'style', 'script', 'sup', 'figure', 'math'}
+_SKIPPED_CLASSES = ('mw-editsection', 'reference', 'reflist', 'navbox', 'thumb', 'infobox', 'hatnote', 'mw-empty-elt')
+_BLOCK_TAGS = {'p', 'div', 'li', 'br', 'h2', 'h3', 'h4', 'h5', 'h6', 'dd', 'dt', 'blockquote'}
+_VOID_TAGS = {'br', 'img', 'hr', 'meta', 'link', 'input', 'wbr'}
+_HEADING_TAGS = {'h2', 'h3', 'h4', 'h5', 'h6'}
+
+
+class _TextExtractor(HTMLParser):
+    """Collect readable prose from parsed article HTML, skipping tables, references and chrome.
+
+    With `lead_only`, stops at the first subheading: the section's own
+    heading comes first, so that is the second heading, or any heading
+    once some text has been collected.
+    """
+
+    def __init__(self, lead_only=False):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+        self.lead_only = lead_only
+        self.headings = 0
+        self.stopped = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.stopped:
+            return
+        if tag in _HEADING_TAGS and self.lead_only:
+            self.headings += 1
+            if self.headings > 1 or ''.join(self.parts).strip():
+                self.stopped = True
+                return
+        if tag in _VOID_TAGS:
+            if tag == 'br' and not self.skip_depth:
+                self.parts.append('\n')
+            return
+        if self.skip_depth:
+            self.skip_depth += 1
+            return
+        classes = dict(attrs).get('class') or ''
+        if tag in _SKIPPED_TAGS or tag in _HEADING_TAGS or any(c in classes for c in _SKIPPED_CLASSES):
+            self.skip_depth = 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if self.stopped or tag in _VOID_TAGS:
+            return
+        if self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self.skip_depth and not self.stopped:
+            self.parts.append(data)
+
+
+def html_to_text(fragment, lead_only=False):
+    """Turn a parsed wikitext HTML fragment into plain paragraphs, optionally only up to the first subheading"""
+    extractor = _TextExtractor(lead_only)
+    extractor.feed(fragment)
+    extractor.close()
+    text = ''.join(extractor.parts)
+    lines = [' '.join(line.split()) for line in text.split('\n')]
+    return '\n\n'.join(line for line in lines if line)
+
+
+def _strip_tags(markup):
+    return re.sub(r'<[^>]+>', '', markup or '').strip()
+
+
+def normalize_title(title):
+    """Normalize a title the way MediaWiki does for lookups: underscores, spacing, first letter"""
+    title = ' '.join(title.replace('_', ' ').split())
+    return title[:1].upper() + title[1:]
+
+
+class WikipediaClient:
+    """MediaWiki API client with a shared keep-alive session and an on-disk cache.
+
+    Outlines and sections are cached by canonical title together with the
+    revision they were fetched at. Entries younger than `revalidate_after`
+    seconds are served without any network call; older ones are revalidated
+    with one batched revision lookup and only refetched when the article
+    changed (sending the stored ETag, if the server gave one).
+    """
+
+    def __init__(self, api_url=None, cache_path=DEFAULT_CACHE_PATH, timeout=15, revalidate_after=600, session=None):
+        self.api_url = api_url or API_URL
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.revalidate_after = revalidate_after
+        if session is None:
+            # Wikipedia asks clients to identify themselves; requests' default agent doesn't
+            session = requests.Session()
+            session.headers['User-Agent'] = USER_AGENT
+        self.session = session
+        self._local = threading.local()
+        if self.cache_path:
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " key TEXT PRIMARY KEY, title TEXT NOT NULL, revision INTEGER,"
+                " etag TEXT, payload TEXT NOT NULL, checked REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS aliases ("
+                " alias TEXT PRIMARY KEY, title TEXT, checked REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.cache_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, params, etag=None):
+        """GET the API; returns (data, etag), with data None on 304 Not Modified"""
+        headers = {'If-None-Match': etag} if etag else {}
+        params = dict(params, format='json', formatversion=2)
+        with metrics.timer('wikipedia_request_seconds', action=params.get('action')):
+            response = self.session.get(self.api_url, params=params, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return response.json(), response.headers.get('ETag')
+
+    def _cache_get(self, key):
+        if not self.cache_path:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT title, revision, etag, payload, checked FROM pages WHERE key=?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        return {'title': row[0], 'revision': row[1], 'etag': row[2], 'payload': json.loads(row[3]), 'checked': row[4]}
+
+    def _cache_put(self, key, title, revision, etag, payload):
+        if not self.cache_path:
+            return
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (key, title, revision, etag, json.dumps(payload), time.time())
+            )
+        except sqlite3.Error:
+            pass
+
+    def _cache_touch(self, key, revision):
+        if self.cache_path:
+            try:
+                self._connection().execute(
+                    "UPDATE pages SET revision=?, checked=? WHERE key=?", (revision, time.time(), key)
+                )
+            except sqlite3.Error:
+                pass
+
+    def _cached_alias(self, alias):
+        if not self.cache_path:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT title, checked FROM aliases WHERE alias=?", (alias,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row and time.time() - row[1] < self.revalidate_after:
+            return row
+        return None
+
+    def resolve_titles(self, titles):
+        """Resolve titles through normalization and redirects in batched queries.
+
+        Returns {input title: {'title', 'revision'}} with None for missing pages.
+        """
+        resolved = {}
+        wanted = list(dict.fromkeys(normalize_title(t) for t in titles if t and t.strip()))
+        for start in range(0, len(wanted), MAX_TITLES_PER_QUERY):
+            batch = wanted[start:start + MAX_TITLES_PER_QUERY]
+            data, _ = self._get({
+                "action": "query",
+                "prop": "info",
+                "redirects": 1,
+                "titles": '|'.join(batch)
+            })
+            query = data.get('query', {})
+            mapping = {}
+            for step in query.get('normalized', []) + query.get('redirects', []):
+                mapping[step['from']] = step['to']
+            pages = {page['title']: page for page in query.get('pages', [])}
+            for title in batch:
+                target = title
+                for _ in range(3):
+                    target = mapping.get(target, target)
+                page = pages.get(target)
+                if page is None or page.get('missing') or page.get('invalid'):
+                    resolved[title] = None
+                else:
+                    resolved[title] = {'title': page['title'], 'revision': page.get('lastrevid')}
+                if self.cache_path:
+                    canonical = resolved[title]['title'] if resolved[title] else None
+                    # The canonical title is an alias of itself, so asking for it next needs no lookup either
+                    aliases = {title, canonical} - {None}
+                    try:
+                        self._connection().executemany(
+                            "INSERT OR REPLACE INTO aliases VALUES (?, ?, ?)",
+                            [(alias, canonical, time.time()) for alias in aliases]
+                        )
+                    except sqlite3.Error:
+                        pass
+        return {t: resolved.get(normalize_title(t)) for t in titles if t and t.strip()}
+
+    def _fetch_sections(self, title, etag=None):
+        data, etag = self._get({
+            "action": "parse",
+            "page": title,
+            "prop": "sections|revid"
+        }, etag=etag)
+        if data is None:
+            return None, etag
+        sections = []
+        for section in data.get('parse', {}).get('sections', []):
+            name = _strip_tags(section.get('line'))
+            # Transcluded sections have non-numeric indexes like "T-1" and can't be fetched by number
+            if not str(section.get('index', '')).isdigit() or name.lower() in SKIPPED_SECTIONS:
+                continue
+            sections.append({
+                'index': int(section['index']),
+                'title': name,
+                'level': int(section.get('level', 2)),
+                'number': section.get('number', '')
+            })
+        return sections, etag
+
+    def _fetch_intros(self, titles):
+        intros = {}
+        for start in range(0, len(titles), MAX_EXTRACTS_PER_QUERY):
+            batch = titles[start:start + MAX_EXTRACTS_PER_QUERY]
+            data, _ = self._get({
+                "action": "query",
+                "prop": "extracts",
+                "exintro": 1,
+                "explaintext": 1,
+                "exlimit": len(batch),
+                "titles": '|'.join(batch)
+            })
+            for page in data.get('query', {}).get('pages', []):
+                # Plain-text extracts put one newline between paragraphs; markdown needs a blank line
+                intros[page['title']] = re.sub(r'\s*\n\s*', '\n\n', (page.get('extract') or '').strip())
+        return intros
+
+    def get_outlines(self, titles):
+        """Intro and section list for several articles, keyed by the requested titles.
+
+        Missing articles map to None. Fresh cache entries cost no network at
+        all; everything else shares one batched revision check.
+        """
+        outlines = {}
+        stale = []
+        for title in titles:
+            alias = self._cached_alias(normalize_title(title))
+            if alias is not None:
+                if alias[0] is None:
+                    outlines[title] = None
+                    continue
+                cached = self._cache_get(f"outline:{alias[0]}")
+                if cached and time.time() - cached['checked'] < self.revalidate_after:
+                    outlines[title] = cached['payload']
+                    continue
+            stale.append(title)
+
+        if not stale:
+            return outlines
+
+        resolved = self.resolve_titles(stale)
+        refetch = {}
+        for title in stale:
+            page = resolved.get(title)
+            if page is None:
+                outlines[title] = None
+                continue
+            key = f"outline:{page['title']}"
+            cached = self._cache_get(key)
+            if cached and cached['revision'] == page['revision']:
+                self._cache_touch(key, page['revision'])
+                outlines[title] = cached['payload']
+            else:
+                refetch.setdefault(page['title'], []).append((title, page['revision'], cached))
+
+        if refetch:
+            intros = self._fetch_intros(list(refetch))
+            for canonical, requests_for_title in refetch.items():
+                _, revision, cached = requests_for_title[0]
+                sections, etag = self._fetch_sections(canonical, cached['etag'] if cached else None)
+                if sections is None:
+                    sections = cached['payload']['sections']
+                outline = {
+                    'title': canonical,
+                    'revision': revision,
+                    'intro': intros.get(canonical, ''),
+                    'sections': sections
+                }
+                self._cache_put(f"outline:{canonical}", canonical, revision, etag, outline)
+                for title, _, _ in requests_for_title:
+                    outlines[title] = outline
+        return outlines
+
+    def get_outline(self, title):
+        """Intro and section list for one article, or None if it doesn't exist"""
+        return self.get_outlines([title]).get(title)
+
+    def get_section(self, title, index, revision=None):
+        """Plain text of one section of an (already resolved) article, without its subsections.
+
+        MediaWiki returns a section together with all its subsections; those
+        are listed in the outline and fetched under their own index, so only
+        the text before the first subheading is kept.
+        """
+        key = f"lead:{title}:{index}"
+        cached = self._cache_get(key)
+        if cached and (revision is None or cached['revision'] == revision):
+            return cached['payload']
+        data, etag = self._get({
+            "action": "parse",
+            "page": title,
+            "section": index,
+            "prop": "text",
+            "disableeditsection": 1,
+            "disabletoc": 1
+        }, etag=cached['etag'] if cached else None)
+        if data is None:
+            self._cache_touch(key, revision)
+            return cached['payload']
+        text = html_to_text(data.get('parse', {}).get('text', ''), lead_only=True)
+        self._cache_put(key, title, revision, etag, text)
+        return text